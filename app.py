@@ -1,11 +1,31 @@
 # app.py
-from flask import Flask, request, jsonify, render_template, redirect, url_for, session
+from flask import (Flask, request, jsonify, render_template, redirect, url_for, session,
+                   Response, stream_with_context, copy_current_request_context)
 from flask_cors import CORS
 from database.database_factory import DatabaseHandler, DatabaseType
+from database.bulk_io import EXPORT_FORMATS, normalize_format
+from database.query_history import QueryHistory, is_read_query
+from database.index_advisor import IndexAdvisor
+from database.single_flight import SingleFlight
+from database.live_updates import ChangeHub
+from database.fast_path import FastPath
+from database.cache import create_cache, cache_key
+from database.scheduler import Scheduler, AdmissionRejected, PRIORITY_INTERACTIVE, PRIORITY_ADHOC
+from database.approximate import plan_approximation, estimate
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 from dotenv import load_dotenv
 import os
+import time
+import json
+import math
+import queue
+import uuid
+import hashlib
+import itertools
+import threading
 import openai
 from functools import wraps
+from urllib.parse import urlparse
 
 # Load environment variables
 load_dotenv()
@@ -23,6 +43,104 @@ openai.api_key = os.getenv("OPENAI_API_KEY")
 # Global variable for database handler
 db_handler = None
 
+# Local, append-only record of every generated query and its timings
+query_history = QueryHistory(os.getenv("QUERY_HISTORY_PATH", "query_history.db"))
+
+# Concurrent identical LLM and database calls share one in-flight execution
+flights = SingleFlight(timeout=float(os.getenv("SINGLE_FLIGHT_TIMEOUT", "30")))
+
+# Admission control: bounded concurrency, per-user/per-database rate limits
+llm_scheduler = Scheduler(
+    "llm",
+    max_concurrent=int(os.getenv("LLM_MAX_CONCURRENT", "4")),
+    max_queue=int(os.getenv("LLM_MAX_QUEUE", "32")),
+    user_rate=float(os.getenv("LLM_USER_RATE", "0.5")),
+    user_burst=float(os.getenv("LLM_USER_BURST", "3"))
+)
+db_scheduler = Scheduler(
+    "database",
+    max_concurrent=int(os.getenv("DB_MAX_CONCURRENT", "8")),
+    max_queue=int(os.getenv("DB_MAX_QUEUE", "64")),
+    user_rate=float(os.getenv("DB_USER_RATE", "5")),
+    user_burst=float(os.getenv("DB_USER_BURST", "10")),
+    db_rate=float(os.getenv("DB_RATE", "20")),
+    db_burst=float(os.getenv("DB_BURST", "40"))
+)
+
+# One change watcher per open table, shared by every dashboard showing it
+change_hub = ChangeHub(poll_interval=float(os.getenv("LIVE_POLL_INTERVAL", "2")))
+
+# Shared cache tier: memory:// per process, shm:// per host, redis:// across hosts
+cache = create_cache(os.getenv("CACHE_URL", "memory://"), dumps=app.json.dumps)
+SCHEMA_CACHE_TTL = float(os.getenv("SCHEMA_CACHE_TTL", "60"))
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "86400"))
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "30"))
+
+LLM_MODEL = "gpt-3.5-turbo"
+
+# Answers common question shapes from the schema without calling the LLM
+fast_path = FastPath(
+    min_confidence=float(os.getenv("FAST_PATH_MIN_CONFIDENCE", "0.9")),
+    cache=cache
+)
+
+# Progressive answers: aggregates over tables at least APPROX_MIN_ROWS large get
+# an estimate from ~APPROX_SAMPLE_ROWS sampled rows before the exact result
+APPROX_MIN_ROWS = float(os.getenv("APPROX_MIN_ROWS", "1000000"))
+APPROX_SAMPLE_ROWS = int(os.getenv("APPROX_SAMPLE_ROWS", "100000"))
+exact_queries = ThreadPoolExecutor(
+    max_workers=int(os.getenv("PROGRESSIVE_MAX_WORKERS", "16")),
+    thread_name_prefix="exact-query"
+)
+
+@app.errorhandler(AdmissionRejected)
+def admission_rejected(e):
+    """Back-pressure response telling the client when to retry"""
+    response = jsonify({"error": str(e), "retry_after": e.retry_after})
+    response.headers["Retry-After"] = str(math.ceil(e.retry_after))
+    return response, 429
+
+def _user_key():
+    """Identifies the caller for per-user rate limits"""
+    return session.get('uid') or request.remote_addr
+
+def _credential_fingerprint():
+    """Hash identifying the database the current session is connected to"""
+    raw = json.dumps([session.get('db_type'), session.get('db_credentials')], sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def _history_database():
+    """
+    (db_name, scope) for query history: the database name without secrets and
+    a hash of server, port, user and name that never includes the password
+    """
+    credentials = session.get('db_credentials', {})
+    db_name = credentials.get('dbname')
+    host, port, user = credentials.get('host'), credentials.get('port'), credentials.get('user')
+    if session.get('db_type') == DatabaseType.SQLITE.value and db_name:
+        # SQLite Cloud connection strings carry the API key in the query string
+        parsed = urlparse(db_name)
+        host, port, db_name = parsed.hostname, parsed.port, parsed.path.lstrip('/')
+    raw = json.dumps([session.get('db_type'), host, str(port or ''), user, db_name])
+    return db_name, hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def _data_generation():
+    """Counter folded into result cache keys; bumped by writes to invalidate them"""
+    return cache.get(cache_key("generation", _credential_fingerprint())) or 0
+
+def _bump_data_generation():
+    cache.set(cache_key("generation", _credential_fingerprint()), time.time_ns(), 7 * 86400)
+
+def _cached_call(key, ttl, flight_key, fn, *args, **kwargs):
+    """Serve from the shared cache, otherwise run once across concurrent callers and store"""
+    value = cache.get(key)
+    if value is not None:
+        return value
+    value = flights.do(flight_key, fn, *args, **kwargs)
+    if ttl and value:
+        cache.set(key, value, ttl)
+    return value
+
 def get_db_handler():
     """Helper function to get or recreate database handler"""
     global db_handler
@@ -133,6 +251,7 @@ def connect_db():
         if success:
             session['db_credentials'] = credentials
             session['db_type'] = db_type
+            session['uid'] = uuid.uuid4().hex
             return jsonify({
                 "message": f"Connected to {db_type} database successfully!",
                 "redirect": url_for('dashboard')
@@ -150,7 +269,12 @@ def connect_db():
 @require_db_connection
 def dashboard():
     """Display database dashboard"""
-    tables = db_handler.get_tables()
+    db_scheduler.check_rate(_user_key(), _credential_fingerprint())
+    tables = _cached_call(
+        cache_key("tables", _credential_fingerprint()), SCHEMA_CACHE_TTL,
+        (_credential_fingerprint(), "get_tables"),
+        db_scheduler.run, db_handler.get_tables, priority=PRIORITY_INTERACTIVE
+    )
     db_name = session.get('db_credentials', {}).get('dbname', 'Unknown')
     return render_template(
         "dashboard.html", 
@@ -163,9 +287,52 @@ def dashboard():
 @require_db_connection
 def get_table_data(table_name):
     """Get data for specific table"""
+    db_scheduler.check_rate(_user_key(), _credential_fingerprint())
     try:
-        data = db_handler.get_table_data(table_name)
+        data = _cached_call(
+            cache_key("table_data", _credential_fingerprint(), _data_generation(), table_name),
+            RESULT_CACHE_TTL,
+            (_credential_fingerprint(), "get_table_data", table_name),
+            db_scheduler.run, db_handler.get_table_data, table_name, priority=PRIORITY_INTERACTIVE
+        )
         return jsonify(data), 200
+    except AdmissionRejected:
+        raise
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route("/live/<table_name>")
+@require_db_connection
+def live_table(table_name):
+    """Server-Sent Events stream of a table's current preview followed by its row deltas"""
+    connection_key = _credential_fingerprint()
+    subscription = change_hub.subscribe(connection_key, table_name, db_handler)
+
+    def stream():
+        try:
+            while True:
+                try:
+                    event = subscription.get(timeout=15)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"data: {app.json.dumps(event)}\n\n"
+        finally:
+            change_hub.unsubscribe(connection_key, table_name, subscription)
+
+    return Response(
+        stream(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.route("/live/<table_name>/trigger", methods=["POST"])
+@require_db_connection
+def install_live_trigger(table_name):
+    """Install the PostgreSQL NOTIFY trigger so live updates for a table stop polling"""
+    try:
+        db_handler.install_change_trigger(table_name)
+        return jsonify({"table": table_name, "installed": True}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
@@ -178,25 +345,272 @@ def execute_query():
         return jsonify({"error": "Query prompt is required"}), 400
 
     try:
-        # Generate SQL using GPT
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a mysql expert. Generate only the mysql query without any explanation."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0
-        )
-        
-        sql_query = response.choices[0].message.content.strip()
+        # Rate limit before generating, so a rejected request costs no LLM call
+        db_scheduler.check_rate(_user_key(), _credential_fingerprint())
+        sql_query, source, llm_ms = _resolve_query(prompt)
         print(sql_query)
+
+        # Only reads are coalesced and cached; identical writes must each run
+        if is_read_query(sql_query):
+            result = _cached_call(
+                cache_key("result", _credential_fingerprint(), _data_generation(), sql_query),
+                RESULT_CACHE_TTL,
+                (_credential_fingerprint(), "execute_query", sql_query),
+                db_scheduler.run, _run_query, prompt, sql_query, llm_ms, priority=PRIORITY_ADHOC
+            )
+        else:
+            result = db_scheduler.run(_run_query, prompt, sql_query, llm_ms, priority=PRIORITY_ADHOC)
+            _bump_data_generation()
+        return jsonify({**result, "source": source}), 200
         
-        # Execute query
-        result = db_handler.execute_query(sql_query)
-        result['query'] = sql_query  # Include the generated query in response
-        
+    except AdmissionRejected:
+        raise
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route("/execute-query/progressive", methods=["POST"])
+@require_db_connection
+def execute_query_progressive():
+    """
+    Server-Sent Events stream answering a prompt in up to two steps
+
+    The exact query starts first. While it runs, an "estimate" event
+    (aggregates over large tables only, skipped if the exact result is
+    already in) carries results scaled up from a sample with 95% confidence
+    intervals; an "exact" event follows with the full result, or "error".
+    Closing the stream before the exact result arrives cancels the exact query.
+    """
+    prompt = request.form.get("prompt")
+    if not prompt:
+        return jsonify({"error": "Query prompt is required"}), 400
+
+    try:
+        db_scheduler.check_rate(_user_key(), _credential_fingerprint())
+        sql_query, source, llm_ms = _resolve_query(prompt)
+    except AdmissionRejected:
+        raise
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+    is_read = is_read_query(sql_query)
+    result_key = cache_key("result", _credential_fingerprint(), _data_generation(), sql_query)
+    plan = plan_approximation(sql_query, session.get('db_type')) if is_read else None
+    flight_key = (_credential_fingerprint(), "execute_query", sql_query)
+    query_id = uuid.uuid4().hex
+    cancelled = threading.Event()
+    running = threading.Event()
+
+    @copy_current_request_context
+    def run_exact():
+        # A closed stream skips its query, unless coalesced callers are waiting on it
+        if cancelled.is_set() and not (is_read and flights.followers(flight_key)):
+            raise Exception("Query cancelled")
+        running.set()
+        return _run_query(prompt, sql_query, llm_ms, query_id=query_id)
+
+    def event(name, payload):
+        return f"event: {name}\ndata: {app.json.dumps({**payload, 'source': source})}\n\n"
+
+    def stream():
+        cached = cache.get(result_key) if is_read else None
+        if cached is not None:
+            yield event("exact", cached)
+            return
+
+        if is_read:
+            # Coalesced with identical reads from /execute-query and other dashboards
+            future = exact_queries.submit(flights.do, flight_key, db_scheduler.run, run_exact,
+                                          priority=PRIORITY_ADHOC)
+        else:
+            future = exact_queries.submit(db_scheduler.run, run_exact, priority=PRIORITY_ADHOC)
+
+        try:
+            if plan:
+                # Sampled while the exact query runs, so the exact answer is not delayed by it
+                try:
+                    total_rows = db_handler.estimate_rows(plan["table"])
+                    if total_rows and total_rows >= APPROX_MIN_ROWS and not future.done():
+                        approximate = db_scheduler.run(
+                            estimate, plan, total_rows, APPROX_SAMPLE_ROWS, db_handler.execute_query,
+                            priority=PRIORITY_INTERACTIVE
+                        )
+                        if not future.done():
+                            yield event("estimate", {**approximate, "query": sql_query})
+                except Exception as e:
+                    print(f"Error estimating query: {e}")
+
+            while True:
+                try:
+                    result = future.result(timeout=15)
+                    break
+                except FutureTimeout:
+                    yield ": keepalive\n\n"
+            if is_read:
+                cache.set(result_key, result, RESULT_CACHE_TTL)
+            else:
+                _bump_data_generation()
+            yield event("exact", result)
+        except Exception as e:
+            yield event("error", {"error": str(e)})
+        finally:
+            # Client went away (or settled for the estimate) before the exact result.
+            # Only this request's own query is cancelled, and only if no
+            # coalesced caller is still waiting for it.
+            if not future.done():
+                cancelled.set()
+                if running.is_set() and not (is_read and flights.followers(flight_key)):
+                    db_handler.cancel_query(query_id)
+
+    return Response(
+        stream_with_context(stream()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def _resolve_query(prompt):
+    """Query for a prompt from the fast path, the generated-query cache or the LLM"""
+    generated_key = cache_key("generated", LLM_MODEL, prompt)
+    sql_query = fast_path.compile(prompt, session.get('db_type'), _credential_fingerprint(), db_handler)
+    if sql_query:
+        return sql_query, "fast_path", 0.0
+    sql_query = cache.get(generated_key)
+    if sql_query:
+        return sql_query, "cache", 0.0
+    llm_scheduler.check_rate(_user_key())
+    sql_query, llm_ms = flights.do(
+        ("generate_query", prompt),
+        llm_scheduler.run, _generate_query, prompt, priority=PRIORITY_ADHOC
+    )
+    cache.set(generated_key, sql_query, QUERY_CACHE_TTL)
+    return sql_query, "llm", llm_ms
+
+def _generate_query(prompt):
+    """Generate a query for the prompt with GPT, returning it with the LLM latency in ms"""
+    started = time.perf_counter()
+    response = openai.ChatCompletion.create(
+        model=LLM_MODEL,
+        messages=[
+            {"role": "system", "content": "You are a mysql expert. Generate only the mysql query without any explanation."},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=0
+    )
+    llm_ms = (time.perf_counter() - started) * 1000
+    fast_path.record_llm_latency(llm_ms)
+    return response.choices[0].message.content.strip(), llm_ms
+
+def _run_query(prompt, sql_query, llm_ms, query_id=None):
+    """Execute a generated query and record it in the query history"""
+    started = time.perf_counter()
+    try:
+        result = db_handler.execute_query(sql_query, query_id=query_id)
+    except Exception as e:
+        _record_query(prompt, sql_query, llm_ms=llm_ms, error=str(e))
+        raise
+    exec_ms = (time.perf_counter() - started) * 1000
+    result['query'] = sql_query  # Include the generated query in response
+
+    _record_query(prompt, sql_query, row_count=len(result.get('results', [])),
+                  llm_ms=llm_ms, exec_ms=exec_ms)
+    return result
+
+def _record_query(prompt, query, **timings):
+    """Append an execution to the query history without failing the request"""
+    try:
+        db_name, scope = _history_database()
+        query_history.record(session.get('db_type'), db_name, prompt, query, scope=scope, **timings)
+    except Exception as e:
+        app.logger.error(f"Failed to record query history: {str(e)}")
+
+@app.route("/query-history")
+@require_db_connection
+def get_query_history():
+    """Recent generated queries with their timings for the connected database"""
+    limit = request.args.get("limit", 50, type=int)
+    db_name, scope = _history_database()
+    history = query_history.recent(session.get('db_type'), db_name, limit=limit, scope=scope)
+    return jsonify(history), 200
+
+@app.route("/index-advice")
+@require_db_connection
+def index_advice():
+    """Index suggestions for the slowest generated query shapes"""
+    db_name, scope = _history_database()
+    advisor = IndexAdvisor(query_history, db_handler, session.get('db_type'), db_name, scope=scope)
+    try:
+        suggestions = advisor.analyze(
+            min_avg_ms=request.args.get("min_avg_ms", 100.0, type=float),
+            limit=request.args.get("limit", 20, type=int)
+        )
+        return jsonify(suggestions), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route("/metrics/scheduler")
+def scheduler_metrics():
+    """Queue depth, wait times and rejections for LLM and database work"""
+    return jsonify({
+        "llm": llm_scheduler.metrics(),
+        "database": db_scheduler.metrics(),
+        "single_flight": dict(flights.stats)
+    }), 200
+
+@app.route("/metrics/fast-path")
+def fast_path_metrics():
+    """How many prompts were answered without the LLM, and the latency saved"""
+    return jsonify(fast_path.metrics()), 200
+
+@app.route("/export")
+@require_db_connection
+def export_data():
+    """Stream a table or query result as CSV, gzip-CSV, NDJSON or Parquet"""
+    table_name = request.args.get("table")
+    query = request.args.get("query")
+    if not table_name and not query:
+        return jsonify({"error": "A table name or query is required"}), 400
+
+    if query and not table_name and not is_read_query(query):
+        return jsonify({"error": "Only SELECT/WITH or find/aggregate queries can be exported"}), 400
+
+    try:
+        fmt = normalize_format(request.args.get("format"))
+        chunks = db_handler.export_data(table_name=table_name, query=query, fmt=fmt)
+        # Exports are lazy: pull the first chunk so bad tables or SQL fail with a 400
+        # instead of an empty or truncated 200 download
+        first = next(chunks, None)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+    if first is not None:
+        chunks = itertools.chain([first], chunks)
+
+    mimetype, extension = EXPORT_FORMATS[fmt]
+    filename = f"{table_name or 'query_result'}.{extension}"
+    return Response(
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@app.route("/import/<table_name>", methods=["POST"])
+@require_db_connection
+def import_data(table_name):
+    """Bulk load an uploaded file into a table/collection"""
+    upload = request.files.get("file")
+    fmt = request.form.get("format") or request.args.get("format")
+    if upload:
+        stream = upload.stream
+        if not fmt:
+            # Infer the format from the file extension, e.g. orders.csv.gz
+            fmt = next((name for name, (_, ext) in EXPORT_FORMATS.items()
+                        if upload.filename and upload.filename.lower().endswith("." + ext)), None)
+    else:
+        stream = request.stream
+
+    try:
+        fmt = normalize_format(fmt)
+        result = db_handler.import_data(table_name, stream, fmt=fmt)
+        _bump_data_generation()
         return jsonify(result), 200
-        
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
@@ -0,0 +1,294 @@
+# database/approximate.py
+import json
+import math
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+Z_95 = 1.96
+
+_SQL_QUERY = re.compile(
+    r"^\s*select\s+(?P<select>.+?)\s+from\s+(?P<table>[`\"\w.]+)"
+    r"(?:\s+(?:as\s+)?(?P<alias>(?!where\b|group\b|order\b|limit\b)[`\"\w]+))?"
+    r"(?P<rest>(?:\s+(?:where|group\s+by|order\s+by|limit)\b.*)?)\s*;?\s*$",
+    re.IGNORECASE | re.DOTALL
+)
+_SQL_AGGREGATE_CALL = re.compile(r"^(?P<func>count|sum|avg)\s*\(", re.IGNORECASE)
+_SQL_ALIAS = re.compile(r"^(?:\s+(?:as\s+)?[`\"\w]+)?$", re.IGNORECASE)
+_SQL_ANY_AGGREGATE = re.compile(r"\b(?:count|sum|avg|min|max|group_concat|string_agg|array_agg)\s*\(",
+                                re.IGNORECASE)
+_SQL_UNSUPPORTED = re.compile(r"\b(?:join|union|intersect|except|having|distinct|over)\b|\(\s*select\b",
+                              re.IGNORECASE)
+
+
+def _split_top_level(text: str) -> List[str]:
+    """Split a SELECT list on commas that are not inside parentheses or quotes"""
+    items, depth, quote, current = [], 0, None, []
+    for char in text:
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in "'\"`":
+            quote = char
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "," and depth == 0:
+            items.append("".join(current).strip())
+            current = []
+            continue
+        current.append(char)
+    items.append("".join(current).strip())
+    return items
+
+
+def _parse_aggregate(item: str) -> Optional[Tuple[str, str]]:
+    """
+    (function, argument) for an item that is exactly one COUNT/SUM/AVG call
+    plus an optional alias; anything else around the call gives None
+    """
+    call = _SQL_AGGREGATE_CALL.match(item)
+    if not call:
+        return None
+    depth, quote = 1, None
+    for position in range(call.end(), len(item)):
+        char = item[position]
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in "'\"`":
+            quote = char
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+            if depth == 0:
+                arg = item[call.end():position].strip()
+                if not arg or not _SQL_ALIAS.match(item[position + 1:]):
+                    return None
+                return call.group("func").upper(), arg
+    return None
+
+
+def _sampled_from(db_type: str, table: str, alias: Optional[str], fraction: float) -> str:
+    if db_type == "postgresql":
+        # Block sampling: reads only ~fraction of the table's pages
+        return f"FROM {table}{' AS ' + alias if alias else ''} TABLESAMPLE SYSTEM ({fraction * 100:.6f})"
+    name = alias or table.split(".")[-1]
+    if db_type == "mysql":
+        # No TABLESAMPLE in MySQL: a Bernoulli sample still scans the table but
+        # skips grouping, aggregation and transfer for the unsampled rows
+        return f"FROM (SELECT * FROM {table} WHERE RAND() < {fraction:.8f}) AS {name}"
+    return (f"FROM (SELECT * FROM {table} WHERE abs(random()) % 1000000 < {int(fraction * 1000000)}) "
+            f"AS {name}")
+
+
+def plan_sql(query: str, db_type: str) -> Optional[Dict[str, Any]]:
+    """
+    Check whether a SQL query is a single-table COUNT/SUM/AVG aggregate whose
+    result can be estimated from a sample; returns the parsed pieces or None
+    """
+    if _SQL_UNSUPPORTED.search(query):
+        return None
+    match = _SQL_QUERY.match(query)
+    if not match:
+        return None
+
+    items = _split_top_level(match.group("select"))
+    aggregates = []
+    for position, item in enumerate(items):
+        aggregate = _parse_aggregate(item)
+        if aggregate:
+            aggregates.append((position, *aggregate))
+        elif _SQL_ANY_AGGREGATE.search(item):
+            # MIN/MAX or expressions over aggregates cannot be scaled from a sample
+            return None
+    if not aggregates:
+        return None
+
+    return {
+        "kind": "sql",
+        "db_type": db_type,
+        "table": match.group("table"),
+        "alias": match.group("alias"),
+        "items": items,
+        "rest": match.group("rest"),
+        "aggregates": aggregates,
+    }
+
+
+def _sql_sample_query(plan: Dict[str, Any], fraction: float) -> str:
+    """Original SELECT list plus moment columns, over a sampled FROM"""
+    extra = ["COUNT(*)"]
+    for _, func, arg in plan["aggregates"]:
+        if arg == "*":
+            continue
+        if func == "COUNT":
+            extra.append(f"COUNT({arg})")
+        else:
+            extra.extend([f"SUM({arg})", f"SUM(({arg}) * ({arg}))", f"COUNT({arg})"])
+    select = ", ".join(plan["items"] + extra)
+    sampled = _sampled_from(plan["db_type"], plan["table"], plan["alias"], fraction)
+    return f"SELECT {select} {sampled}{plan['rest']}"
+
+
+def _interval(estimate: Optional[float], variance: Optional[float]) -> Optional[List[float]]:
+    if estimate is None or variance is None or variance < 0:
+        return None
+    half_width = Z_95 * math.sqrt(variance)
+    return [estimate - half_width, estimate + half_width]
+
+
+def _scaled(func: str, fraction: float, total: Optional[float], square_sum: Optional[float],
+            count: Optional[float]):
+    """Estimate and variance of one aggregate from its sample moments"""
+    if func == "COUNT":
+        estimate = count / fraction
+        return estimate, (1 - fraction) * count / fraction ** 2
+    if func == "SUM":
+        if total is None:
+            return None, None
+        return total / fraction, (1 - fraction) * (square_sum or 0) / fraction ** 2
+    # AVG is unbiased on the sample; its variance is that of a sample mean
+    if not count:
+        return None, None
+    mean = total / count
+    if count < 2:
+        return mean, None
+    sample_variance = max(0.0, ((square_sum or 0) - total ** 2 / count) / (count - 1))
+    return mean, sample_variance / count * (1 - fraction)
+
+
+def _estimate_sql(plan: Dict[str, Any], fraction: float, execute: Callable[[str], Dict[str, Any]]) -> Dict[str, Any]:
+    result = execute(_sql_sample_query(plan, fraction))
+    width = len(plan["items"])
+    columns = result["columns"][:width]
+    rows, intervals = [], []
+    for row in result["results"]:
+        row = list(row)
+        moments = [float(v) if v is not None else None for v in row[width:]]
+        sampled_rows = moments[0]
+        cursor = 1
+        row_intervals = {}
+        for position, func, arg in plan["aggregates"]:
+            if arg == "*":
+                total = square_sum = None
+                count = sampled_rows
+            elif func == "COUNT":
+                total = square_sum = None
+                count = moments[cursor]
+                cursor += 1
+            else:
+                total, square_sum, count = moments[cursor:cursor + 3]
+                cursor += 3
+            estimate, variance = _scaled(func, fraction, total, square_sum, count)
+            row[position] = estimate
+            row_intervals[columns[position]] = _interval(estimate, variance)
+        rows.append(row[:width])
+        intervals.append(row_intervals)
+    return {"columns": columns, "results": rows, "confidence_intervals": intervals}
+
+
+def plan_mongo(query: str) -> Optional[Dict[str, Any]]:
+    """
+    Check whether a MongoDB aggregate is $match* then one $group using only
+    $sum/$avg/$count accumulators, followed only by $sort/$limit
+    """
+    try:
+        query_dict = json.loads(query)
+    except ValueError:
+        return None
+    if query_dict.get("operation") != "aggregate":
+        return None
+
+    pipeline = query_dict.get("pipeline", [])
+    group_index = next((i for i, stage in enumerate(pipeline) if "$group" in stage), None)
+    if group_index is None:
+        return None
+    if any(set(stage) != {"$match"} for stage in pipeline[:group_index]):
+        return None
+    if any(not set(stage) <= {"$sort", "$limit"} for stage in pipeline[group_index + 1:]):
+        return None
+
+    accumulators = {}
+    for field, spec in pipeline[group_index]["$group"].items():
+        if field == "_id":
+            continue
+        if not isinstance(spec, dict) or len(spec) != 1:
+            return None
+        operator, expression = next(iter(spec.items()))
+        if operator == "$count":
+            operator, expression = "$sum", 1
+        if operator not in ("$sum", "$avg"):
+            return None
+        accumulators[field] = (operator, expression)
+    if not accumulators:
+        return None
+
+    return {
+        "kind": "mongodb",
+        "table": query_dict["collection"],
+        "query": query_dict,
+        "group_index": group_index,
+        "accumulators": accumulators,
+    }
+
+
+def _estimate_mongo(plan: Dict[str, Any], fraction: float, sample_size: int,
+                    execute: Callable[[str], Dict[str, Any]]) -> Dict[str, Any]:
+    query = plan["query"]
+    pipeline = query["pipeline"]
+    group = dict(pipeline[plan["group_index"]]["$group"])
+    for field, (operator, expression) in plan["accumulators"].items():
+        group[field] = {operator: expression}
+        group[f"__s1_{field}"] = {"$sum": expression}
+        group[f"__s2_{field}"] = {"$sum": {"$multiply": [expression, expression]}}
+        group[f"__c_{field}"] = {"$sum": {"$cond": [{"$isNumber": expression}, 1, 0]}}
+
+    sample_pipeline = ([{"$sample": {"size": sample_size}}] + pipeline[:plan["group_index"]]
+                       + [{"$group": group}] + pipeline[plan["group_index"] + 1:])
+    result = execute(json.dumps({**query, "pipeline": sample_pipeline}))
+
+    columns = [c for c in result["columns"] if not str(c).startswith("__")]
+    rows, intervals = [], []
+    for row in result["results"]:
+        record = dict(zip(result["columns"], row))
+        row_intervals = {}
+        for field, (operator, _) in plan["accumulators"].items():
+            total = record.get(f"__s1_{field}")
+            square_sum = record.get(f"__s2_{field}")
+            count = record.get(f"__c_{field}")
+            func = "AVG" if operator == "$avg" else "SUM"
+            estimate, variance = _scaled(func, fraction, total, square_sum, count)
+            record[field] = estimate
+            row_intervals[field] = _interval(estimate, variance)
+        rows.append([record.get(c) for c in columns])
+        intervals.append(row_intervals)
+    return {"columns": columns, "results": rows, "confidence_intervals": intervals}
+
+
+def plan_approximation(query: str, db_type: str) -> Optional[Dict[str, Any]]:
+    """Parse a generated query into an approximation plan, or None if it is not eligible"""
+    if db_type == "mongodb":
+        return plan_mongo(query)
+    return plan_sql(query, db_type)
+
+
+def estimate(plan: Dict[str, Any], total_rows: float, sample_rows: int,
+             execute: Callable[[str], Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Run the sampled version of a planned query and scale it up
+
+    COUNT and SUM are divided by the sampling fraction, AVG is taken as is.
+    Intervals are 95% normal approximations; block sampling (TABLESAMPLE
+    SYSTEM) understates them on tables whose rows are clustered on disk.
+    """
+    if plan["kind"] == "mongodb":
+        # $sample stays on the fast random-cursor path below 5% of the collection
+        sample_size = max(1, int(min(sample_rows, total_rows * 0.05)))
+        fraction = sample_size / total_rows
+        result = _estimate_mongo(plan, fraction, sample_size, execute)
+    else:
+        fraction = min(1.0, sample_rows / total_rows)
+        result = _estimate_sql(plan, fraction, execute)
+    return {**result, "approximate": True, "sample_fraction": fraction}
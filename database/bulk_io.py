@@ -0,0 +1,356 @@
+# database/bulk_io.py
+import csv
+import datetime
+import gzip
+import io
+import json
+import queue
+import tempfile
+import threading
+import zlib
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+DEFAULT_BATCH_SIZE = 10000
+
+# format name -> (mimetype, file extension)
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "csv.gz": ("application/gzip", "csv.gz"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+IMPORT_FORMATS = tuple(EXPORT_FORMATS)
+
+
+def normalize_format(fmt: Optional[str]) -> str:
+    """Validate a bulk I/O format name, defaulting to CSV"""
+    fmt = (fmt or "csv").lower()
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported format: {fmt}. Use one of {', '.join(EXPORT_FORMATS)}")
+    return fmt
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ValueError("Parquet support requires the 'pyarrow' package")
+    return pyarrow, pyarrow.parquet
+
+
+def iter_fetchmany(cursor, batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[List[tuple]]:
+    """Yield row batches from a DB-API cursor without materialising the result"""
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        yield rows
+
+
+def gzip_chunks(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """Gzip-compress a stream of byte chunks incrementally"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object that hands written bytes back to a generator"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _encode_csv(columns: List[str], batches: Iterable[List[tuple]]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for rows in batches:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def _encode_ndjson(columns: List[str], batches: Iterable[List[tuple]]) -> Iterator[bytes]:
+    for rows in batches:
+        lines = [json.dumps(dict(zip(columns, row)), default=str) for row in rows]
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+# Column kinds an export can declare for Parquet; anything else is exported as "string"
+PARQUET_KINDS = ("int", "float", "bool", "string", "binary", "date", "timestamp", "timestamptz")
+
+_PARQUET_PYTHON_TYPES = {
+    "int": int,
+    "float": float,
+    "bool": bool,
+    "binary": bytes,
+    "date": datetime.date,
+    "timestamp": datetime.datetime,
+    "timestamptz": datetime.datetime,
+}
+
+
+def infer_kinds(columns: List[str], rows: List[tuple]) -> List[str]:
+    """
+    Column kinds for a result that is already fully in memory (no driver
+    type information): a column keeps its Python type only if every
+    non-NULL value shares it, otherwise it is exported as strings
+    """
+    kinds = []
+    for index in range(len(columns)):
+        seen = {type(row[index]) for row in rows if row[index] is not None}
+        if seen == {int, float} and all(abs(row[index]) < 2 ** 53 for row in rows
+                                        if isinstance(row[index], int)):
+            kinds.append("float")
+            continue
+        kind = {frozenset({int}): "int", frozenset({float}): "float", frozenset({bool}): "bool",
+                frozenset({bytes}): "binary"}.get(frozenset(seen), "string")
+        kinds.append(kind)
+    return kinds
+
+
+def _parquet_value(value: Any, kind: str, column: str) -> Any:
+    """Check a value against its column kind; only "string" columns convert values"""
+    if value is None:
+        return None
+    if kind == "string":
+        if isinstance(value, str):
+            return value
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return bytes(value).decode("utf-8", errors="backslashreplace")
+        if isinstance(value, (dict, list)):
+            return json.dumps(value, default=str)
+        return str(value)
+    if kind == "binary" and isinstance(value, (bytearray, memoryview)):
+        return bytes(value)
+    if kind == "float" and type(value) is int:
+        return float(value)
+    expected = _PARQUET_PYTHON_TYPES[kind]
+    mismatched = (not isinstance(value, expected)
+                  or (kind == "int" and isinstance(value, bool))
+                  or (kind == "date" and isinstance(value, datetime.datetime)))
+    if mismatched:
+        raise ValueError(f"Export error: column {column} holds a {type(value).__name__}, expected {kind}")
+    return value
+
+
+def _encode_parquet(columns: List[str], batches: Iterable[List[tuple]],
+                    kinds: Optional[List[str]]) -> Iterator[bytes]:
+    pa, pq = _require_pyarrow()
+    arrow_types = {
+        "int": pa.int64(), "float": pa.float64(), "bool": pa.bool_(), "string": pa.string(),
+        "binary": pa.binary(), "date": pa.date32(), "timestamp": pa.timestamp("us"),
+        "timestamptz": pa.timestamp("us", tz="UTC"),
+    }
+    # The schema comes from the result's declared column types, never from the
+    # first batch, so later batches cannot be truncated or rejected mid-stream
+    kinds = [kind if kind in arrow_types else "string" for kind in (kinds or ["string"] * len(columns))]
+    schema = pa.schema([pa.field(column, arrow_types[kind]) for column, kind in zip(columns, kinds)])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    for rows in batches:
+        arrays = [
+            pa.array([_parquet_value(row[index], kind, column) for row in rows], type=arrow_types[kind])
+            for index, (column, kind) in enumerate(zip(columns, kinds))
+        ]
+        writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def encode_rows(columns: List[str], batches: Iterable[List[tuple]], fmt: str,
+                kinds: Optional[List[str]] = None) -> Iterator[bytes]:
+    """
+    Encode batches of row tuples as a stream of bytes in the requested format
+
+    kinds (see PARQUET_KINDS) sets the Parquet column types; columns without
+    one are exported as strings. CSV and NDJSON ignore it.
+    """
+    fmt = normalize_format(fmt)
+    if fmt == "csv":
+        return _encode_csv(columns, batches)
+    if fmt == "csv.gz":
+        return gzip_chunks(_encode_csv(columns, batches))
+    if fmt == "ndjson":
+        return _encode_ndjson(columns, batches)
+    return _encode_parquet(columns, batches, kinds)
+
+
+class _QueueWriter(io.RawIOBase):
+    """File object that forwards writes to a bounded queue"""
+
+    def __init__(self, chunks: "queue.Queue", cancelled: threading.Event):
+        self.chunks = chunks
+        self.cancelled = cancelled
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        while True:
+            if self.cancelled.is_set():
+                raise IOError("Export cancelled by client")
+            try:
+                self.chunks.put(data, timeout=1)
+                return len(data)
+            except queue.Full:
+                continue
+
+
+def stream_from_writer(write_fn: Callable[[Any], None], max_chunks: int = 16) -> Iterator[bytes]:
+    """
+    Turn a push-style writer (e.g. psycopg2 copy_expert) into a pull-style generator
+
+    write_fn runs on a worker thread and receives a file object. At most
+    max_chunks chunks are buffered, so memory stays constant regardless of
+    result size. Closing the generator early aborts the writer.
+    """
+    chunks = queue.Queue(maxsize=max_chunks)
+    cancelled = threading.Event()
+    done = object()
+    errors = []
+
+    def worker():
+        try:
+            write_fn(_QueueWriter(chunks, cancelled))
+        except Exception as e:
+            errors.append(e)
+        finally:
+            while not cancelled.is_set():
+                try:
+                    chunks.put(done, timeout=1)
+                    break
+                except queue.Full:
+                    continue
+
+    thread = threading.Thread(target=worker, daemon=True)
+    thread.start()
+    try:
+        while True:
+            chunk = chunks.get()
+            if chunk is done:
+                break
+            yield chunk
+    finally:
+        cancelled.set()
+        thread.join()
+    if errors:
+        raise errors[0]
+
+
+def _decode_stream(stream, fmt: str):
+    """Wrap a binary upload stream as text, decompressing gzip input"""
+    if fmt == "csv.gz":
+        stream = gzip.GzipFile(fileobj=stream, mode="rb")
+    return io.TextIOWrapper(stream, encoding="utf-8", newline="")
+
+
+def read_batches(stream, fmt: str,
+                 batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[Tuple[List[str], List[tuple]]]:
+    """
+    Parse an uploaded file into (columns, rows) batches
+
+    CSV input must have a header row. NDJSON columns are taken from the
+    first record; keys missing from later records are imported as NULL.
+    """
+    fmt = normalize_format(fmt)
+
+    if fmt in ("csv", "csv.gz"):
+        reader = csv.reader(_decode_stream(stream, fmt))
+        columns = next(reader, None)
+        if not columns:
+            return
+        batch = []
+        for row in reader:
+            batch.append(tuple(value if value != "" else None for value in row))
+            if len(batch) >= batch_size:
+                yield columns, batch
+                batch = []
+        if batch:
+            yield columns, batch
+
+    elif fmt == "ndjson":
+        columns = None
+        batch = []
+        for line in _decode_stream(stream, fmt):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if columns is None:
+                columns = list(record.keys())
+            batch.append(tuple(record.get(col) for col in columns))
+            if len(batch) >= batch_size:
+                yield columns, batch
+                batch = []
+        if batch:
+            yield columns, batch
+
+    else:
+        _, pq = _require_pyarrow()
+        # Parquet needs random access to the footer, so spool the upload first
+        with tempfile.SpooledTemporaryFile(max_size=64 * 1024 * 1024) as spool:
+            while True:
+                chunk = stream.read(1024 * 1024)
+                if not chunk:
+                    break
+                spool.write(chunk)
+            spool.seek(0)
+            parquet_file = pq.ParquetFile(spool)
+            columns = parquet_file.schema_arrow.names
+            for record_batch in parquet_file.iter_batches(batch_size=batch_size):
+                records = record_batch.to_pylist()
+                yield columns, [tuple(record.get(col) for col in columns) for record in records]
+
+
+def read_documents(stream, fmt: str,
+                   batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[List[Dict[str, Any]]]:
+    """Parse an uploaded file into batches of dicts, for document stores"""
+    fmt = normalize_format(fmt)
+    if fmt == "ndjson":
+        # Keep nested values and per-document keys intact
+        batch = []
+        for line in _decode_stream(stream, fmt):
+            line = line.strip()
+            if not line:
+                continue
+            batch.append(json.loads(line))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+        return
+
+    for columns, rows in read_batches(stream, fmt, batch_size):
+        yield [{col: value for col, value in zip(columns, row) if value is not None}
+               for row in rows]
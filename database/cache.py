@@ -0,0 +1,265 @@
+# database/cache.py
+import fcntl
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Optional
+from urllib.parse import urlparse, parse_qs
+
+
+def cache_key(*parts: Any) -> str:
+    """Stable key for arbitrary JSON-able parts (prompts, credentials hashes, queries)"""
+    raw = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class CacheBackend(ABC):
+    """Interface shared by the in-process, shared-memory and network caches"""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value, or None on a miss"""
+        pass
+
+    @abstractmethod
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        """Store a value for ttl seconds"""
+        pass
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """Remove a value if present"""
+        pass
+
+    def get_or_set(self, key: str, ttl: float, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Return the cached value, computing and storing it on a miss"""
+        value = self.get(key)
+        if value is None:
+            value = fn(*args, **kwargs)
+            if value is not None:
+                self.set(key, value, ttl)
+        return value
+
+
+class LRUCache(CacheBackend):
+    """In-process cache; values are stored as-is, so callers must not mutate them"""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class SharedMemoryCache(CacheBackend):
+    """
+    Cache in a memory-mapped file shared by every worker process on a host
+
+    The file is a set-associative table: each key hashes to a set of `ways`
+    fixed-size slots and evicts the oldest entry in that set. Values are
+    JSON-encoded; values larger than a slot are simply not cached. Access is
+    serialised with flock across processes and a lock within the process.
+    """
+
+    _HEADER = struct.Struct("<16sddI")  # key digest, stored_at, expires_at, length
+
+    def __init__(self, path: str, slots: int = 4096, slot_size: int = 64 * 1024, ways: int = 4,
+                 dumps: Callable[[Any], str] = None, loads: Callable[[str], Any] = json.loads):
+        self.path = path
+        self.slot_size = slot_size
+        self.ways = ways
+        self.sets = max(1, slots // ways)
+        self.dumps = dumps or (lambda value: json.dumps(value, default=str))
+        self.loads = loads
+        self._lock = threading.Lock()
+
+        self._size = self.sets * ways * slot_size
+        self._open()
+
+    def _open(self) -> None:
+        self._pid = os.getpid()
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._fd).st_size != self._size:
+                os.ftruncate(self._fd, self._size)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._map = mmap.mmap(self._fd, self._size)
+
+    def _reopen_after_fork(self) -> None:
+        """
+        flock only excludes separate open file descriptions, and forked
+        workers (e.g. gunicorn --preload) inherit this process's one, so each
+        process opens its own. Caller holds self._lock.
+        """
+        if self._pid == os.getpid():
+            return
+        self._map.close()
+        os.close(self._fd)
+        self._open()
+
+    def _locate(self, key: str):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little") % self.sets * self.ways
+        return digest, range(first, first + self.ways)
+
+    def _header(self, slot: int):
+        return self._HEADER.unpack_from(self._map, slot * self.slot_size)
+
+    @contextmanager
+    def _locked(self, operation: int):
+        with self._lock:
+            self._reopen_after_fork()
+            fcntl.flock(self._fd, operation)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def get(self, key: str) -> Optional[Any]:
+        digest, slots = self._locate(key)
+        with self._locked(fcntl.LOCK_SH):
+            for slot in slots:
+                slot_digest, _, expires_at, length = self._header(slot)
+                if slot_digest == digest and expires_at >= time.time():
+                    start = slot * self.slot_size + self._HEADER.size
+                    payload = self._map[start:start + length]
+                    break
+            else:
+                return None
+        return self.loads(payload.decode("utf-8"))
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        payload = self.dumps(value).encode("utf-8")
+        if len(payload) > self.slot_size - self._HEADER.size:
+            return
+        digest, slots = self._locate(key)
+        now = time.time()
+        with self._locked(fcntl.LOCK_EX):
+            # Same key first, then an expired slot, then the oldest entry
+            victim, victim_rank = None, None
+            for slot in slots:
+                slot_digest, stored_at, expires_at, _ = self._header(slot)
+                if slot_digest == digest:
+                    victim = slot
+                    break
+                rank = (expires_at >= now, stored_at)
+                if victim_rank is None or rank < victim_rank:
+                    victim, victim_rank = slot, rank
+            offset = victim * self.slot_size
+            self._HEADER.pack_into(self._map, offset, digest, now, now + ttl, len(payload))
+            self._map[offset + self._HEADER.size:offset + self._HEADER.size + len(payload)] = payload
+
+    def delete(self, key: str) -> None:
+        digest, slots = self._locate(key)
+        with self._locked(fcntl.LOCK_EX):
+            for slot in slots:
+                if self._header(slot)[0] == digest:
+                    self._HEADER.pack_into(self._map, slot * self.slot_size, b"\0" * 16, 0.0, 0.0, 0)
+
+    def close(self) -> None:
+        self._map.close()
+        os.close(self._fd)
+
+
+class RedisCache(CacheBackend):
+    """
+    Cache in a Redis-compatible server shared by every worker and host
+
+    Accepts any client exposing get/set(ex=)/delete, so a local stand-in
+    (e.g. fakeredis) can replace a real server.
+    """
+
+    def __init__(self, client=None, url: str = "redis://localhost:6379/0", prefix: str = "talk_to_db:",
+                 dumps: Callable[[Any], str] = None, loads: Callable[[str], Any] = json.loads):
+        if client is None:
+            try:
+                import redis
+            except ImportError:
+                raise ValueError("Redis caching requires the 'redis' package")
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+        self.dumps = dumps or (lambda value: json.dumps(value, default=str))
+        self.loads = loads
+
+    def get(self, key: str) -> Optional[Any]:
+        try:
+            payload = self.client.get(self.prefix + key)
+        except Exception as e:
+            # A cache outage degrades to misses instead of failing requests
+            print(f"Error reading from cache: {e}")
+            return None
+        if payload is None:
+            return None
+        if isinstance(payload, bytes):
+            payload = payload.decode("utf-8")
+        return self.loads(payload)
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        try:
+            self.client.set(self.prefix + key, self.dumps(value), ex=max(1, int(ttl)))
+        except Exception as e:
+            print(f"Error writing to cache: {e}")
+
+    def delete(self, key: str) -> None:
+        try:
+            self.client.delete(self.prefix + key)
+        except Exception as e:
+            print(f"Error deleting from cache: {e}")
+
+
+def create_cache(url: Optional[str] = None, dumps: Callable[[Any], str] = None) -> CacheBackend:
+    """
+    Build a cache backend from a URL
+
+    memory://?max_entries=1024
+    shm:///tmp/talk_to_db.cache?slots=4096&slot_size=65536
+    redis://host:6379/0
+    """
+    url = url or "memory://"
+    parsed = urlparse(url)
+    params = {name: values[0] for name, values in parse_qs(parsed.query).items()}
+
+    if parsed.scheme == "memory":
+        return LRUCache(max_entries=int(params.get("max_entries", 1024)))
+    if parsed.scheme == "shm":
+        return SharedMemoryCache(
+            parsed.path or "/tmp/talk_to_db.cache",
+            slots=int(params.get("slots", 4096)),
+            slot_size=int(params.get("slot_size", 64 * 1024)),
+            dumps=dumps
+        )
+    if parsed.scheme in ("redis", "rediss"):
+        return RedisCache(url=url, dumps=dumps)
+    raise ValueError(f"Unsupported cache backend: {parsed.scheme}")
@@ -1,6 +1,6 @@
 # database/database_factory.py
 from enum import Enum
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Iterator
 from abc import ABC, abstractmethod
 
 class DatabaseType(Enum):
@@ -34,7 +34,7 @@ class BaseDatabase(ABC):
         pass
     
     @abstractmethod
-    def execute_query(self, query: str) -> Dict[str, Any]:
+    def execute_query(self, query: str, query_id: Optional[str] = None) -> Dict[str, Any]:
         """Execute database query"""
         pass
 
@@ -43,6 +43,37 @@ class BaseDatabase(ABC):
         """Validate if connection is active"""
         pass
 
+    @abstractmethod
+    def explain_query(self, query: str) -> Dict[str, Any]:
+        """Summarise the query plan, listing full table/collection scans"""
+        pass
+
+    @abstractmethod
+    def watch_table(self, table_name: str, stop, poll_interval: float = 2.0) -> Iterator[Optional[Dict[str, Any]]]:
+        """Yield a snapshot, then change events for a table until stop is set, None while idle"""
+        pass
+
+    @abstractmethod
+    def export_data(self, table_name: Optional[str] = None, query: Optional[str] = None,
+                    fmt: str = "csv") -> Iterator[bytes]:
+        """Stream a table or query result as bytes in the given format"""
+        pass
+
+    @abstractmethod
+    def import_data(self, table_name: str, stream, fmt: str = "csv") -> Dict[str, Any]:
+        """Bulk load a file stream into a table/collection"""
+        pass
+
+    @abstractmethod
+    def estimate_rows(self, table_name: str) -> Optional[float]:
+        """Approximate row/document count from statistics, None if unknown"""
+        pass
+
+    @abstractmethod
+    def cancel_query(self, query_id: str) -> bool:
+        """Cancel only the query started with execute_query(query, query_id)"""
+        pass
+
 class DatabaseFactory:
     """Factory class for creating database instances"""
     
@@ -105,10 +136,41 @@ class DatabaseHandler:
         """Get data from specific table"""
         return self.db.get_table_data(table_name)
     
-    def execute_query(self, query: str) -> Dict[str, Any]:
-        """Execute database query"""
-        return self.db.execute_query(query)
+    def execute_query(self, query: str, query_id: Optional[str] = None) -> Dict[str, Any]:
+        """Execute database query; a query_id makes it cancellable with cancel_query"""
+        return self.db.execute_query(query, query_id=query_id)
     
     def validate_connection(self) -> bool:
         """Validate if database connection is active"""
-        return self.db.validate_connection()
\ No newline at end of file
+        return self.db.validate_connection()
+
+    def explain_query(self, query: str) -> Dict[str, Any]:
+        """Summarise the query plan, listing full table/collection scans"""
+        return self.db.explain_query(query)
+
+    def watch_table(self, table_name: str, stop, poll_interval: float = 2.0) -> Iterator[Optional[Dict[str, Any]]]:
+        """Yield a snapshot, then change events for a table until stop is set, None while idle"""
+        return self.db.watch_table(table_name, stop, poll_interval)
+
+    def export_data(self, table_name: Optional[str] = None, query: Optional[str] = None,
+                    fmt: str = "csv") -> Iterator[bytes]:
+        """Stream a table or query result as bytes in the given format"""
+        return self.db.export_data(table_name=table_name, query=query, fmt=fmt)
+
+    def import_data(self, table_name: str, stream, fmt: str = "csv") -> Dict[str, Any]:
+        """Bulk load a file stream into a table/collection"""
+        return self.db.import_data(table_name, stream, fmt=fmt)
+
+    def estimate_rows(self, table_name: str) -> Optional[float]:
+        """Approximate row/document count from statistics, None if unknown"""
+        return self.db.estimate_rows(table_name)
+
+    def cancel_query(self, query_id: str) -> bool:
+        """Cancel only the query started with execute_query(query, query_id)"""
+        return self.db.cancel_query(query_id)
+
+    def install_change_trigger(self, table_name: str) -> None:
+        """Install the PostgreSQL NOTIFY trigger that lets live dashboards stop polling"""
+        if not hasattr(self.db, "install_change_trigger"):
+            raise ValueError("Change triggers are only supported for PostgreSQL")
+        self.db.install_change_trigger(table_name)
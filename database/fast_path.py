@@ -0,0 +1,216 @@
+# database/fast_path.py
+import difflib
+import json
+import re
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .cache import CacheBackend, LRUCache, cache_key
+
+_NAME = r"[\w ]+?"
+_TABLE_SUFFIX = r"(?: table| collection)?"
+_SHOW = r"(?:(?:show|list|get|display|give|fetch|return)(?: me)?(?: the)? )?"
+
+_COUNT_PATTERNS = [
+    re.compile(rf"^how many (?:rows|records|entries|documents|items) (?:are )?(?:there )?"
+               rf"(?:in|of) (?:the )?(?P<table>{_NAME}){_TABLE_SUFFIX}$"),
+    re.compile(rf"^how many (?P<table>{_NAME}) (?:are there|do we have|exist)$"),
+    re.compile(rf"^(?:count of|count|total number of|number of) (?:(?:rows|records|documents) "
+               rf"(?:in|of) )?(?:the |all )?(?P<table>{_NAME}){_TABLE_SUFFIX}$"),
+]
+_TOP_BY_PATTERN = re.compile(
+    rf"^{_SHOW}(?P<direction>top|bottom|first|last) (?P<n>\d+) (?P<table>{_NAME}) "
+    rf"(?:by|ordered by|sorted by) (?P<column>{_NAME})(?: (?P<order>asc|ascending|desc|descending))?$"
+)
+# "top N <table>" implies a ranking the prompt does not name, so only "first N" is a plain preview
+_FIRST_N_PATTERN = re.compile(
+    rf"^{_SHOW}first (?P<n>\d+) (?:rows |records |documents )?(?:of |from |in )?"
+    rf"(?:the )?(?P<table>{_NAME}){_TABLE_SUFFIX}$"
+)
+_AGGREGATE_PATTERN = re.compile(
+    rf"^(?:what is |what's |show |get )?(?:the )?(?P<func>average|avg|mean|sum|total|minimum|min|"
+    rf"maximum|max|highest|lowest) (?:of )?(?:the )?(?P<column>{_NAME}) (?:in|of|from|across|for) "
+    rf"(?:the |all )?(?P<table>{_NAME}){_TABLE_SUFFIX}$"
+)
+
+_SQL_FUNCTIONS = {
+    "average": "AVG", "avg": "AVG", "mean": "AVG", "sum": "SUM", "total": "SUM",
+    "minimum": "MIN", "min": "MIN", "lowest": "MIN", "maximum": "MAX", "max": "MAX", "highest": "MAX",
+}
+
+
+def _quote(db_type: str, name: str) -> str:
+    if db_type == "mysql":
+        return "`" + name.replace("`", "``") + "`"
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _inflections(word: str) -> List[str]:
+    """Singular and plural forms of a word under the regular English rules (s, es, ies/y)"""
+    forms = [word + "s", word + "es"]
+    if word.endswith("y"):
+        forms.append(word[:-1] + "ies")
+    if word.endswith("ies"):
+        forms.append(word[:-3] + "y")
+    if word.endswith("es"):
+        forms.append(word[:-2])
+    if word.endswith("s"):
+        forms.append(word[:-1])
+    return forms
+
+
+def resolve_name(phrase: str, candidates: List[str]) -> Tuple[Optional[str], float]:
+    """
+    Match a phrase from the prompt to a known table/column name
+
+    Returns (name, confidence): 1.0 for an exact match, 0.95 for a
+    singular/plural or space/underscore variant, the similarity ratio for
+    close spellings, (None, 0.0) otherwise.
+    """
+    phrase = phrase.strip().lower()
+    lowered = {candidate.lower(): candidate for candidate in candidates}
+    if phrase in lowered:
+        return lowered[phrase], 1.0
+    spellings = [phrase.replace(" ", "_"), phrase.replace(" ", "")]
+    variants = spellings + [form for spelling in spellings for form in _inflections(spelling)]
+    matches = [variant for variant in variants if variant in lowered]
+    if matches:
+        # Several variants can exist (e.g. "status" and "statu"): keep the closest spelling
+        best = max(matches, key=lambda match: difflib.SequenceMatcher(None, spellings[0], match).ratio())
+        return lowered[best], 0.95
+    close = difflib.get_close_matches(spellings[0], list(lowered), n=1, cutoff=0.8)
+    if close:
+        return lowered[close[0]], difflib.SequenceMatcher(None, spellings[0], close[0]).ratio()
+    return None, 0.0
+
+
+class FastPath:
+    """
+    Answers common question shapes (counts, first N rows, top N by a column,
+    single-column aggregates) from the schema alone, without calling the LLM
+
+    Prompts must match a pattern end to end and every table/column must
+    resolve with at least min_confidence; anything else returns None so the
+    caller falls back to the LLM.
+    """
+
+    def __init__(self, min_confidence: float = 0.9, schema_ttl: float = 300.0,
+                 cache: Optional[CacheBackend] = None):
+        self.min_confidence = min_confidence
+        self.schema_ttl = schema_ttl
+        # Schema catalog; a shared backend lets every worker reuse one lookup
+        self.cache = cache or LRUCache()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "llm_calls": 0, "llm_ms_total": 0.0}
+
+    def compile(self, prompt: str, db_type: str, connection_key: str,
+                db_handler) -> Optional[str]:
+        """Return a dialect-correct query for the prompt, or None to use the LLM"""
+        text = re.sub(r"\s+", " ", prompt.strip().lower()).rstrip("?.! ")
+
+        def columns_of(table: str) -> List[str]:
+            return self.cache.get_or_set(
+                cache_key("schema:columns", connection_key, table), self.schema_ttl,
+                lambda: [c["name"] for c in db_handler.get_table_data(table)["columns"]]
+            )
+
+        try:
+            tables = self.cache.get_or_set(
+                cache_key("schema:tables", connection_key), self.schema_ttl,
+                lambda: [t["name"] for t in db_handler.get_tables()]
+            )
+            query = self._match(text, db_type, tables, columns_of)
+        except Exception as e:
+            # Schema lookups failing must never block the LLM path
+            print(f"Fast path lookup failed: {e}")
+            query = None
+        with self._lock:
+            self.stats["hits" if query else "misses"] += 1
+        return query
+
+    def _match(self, text: str, db_type: str, tables: List[str],
+               columns_of: Callable[[str], List[str]]) -> Optional[str]:
+        for pattern in _COUNT_PATTERNS:
+            match = pattern.match(text)
+            if match:
+                table, confidence = resolve_name(match.group("table"), tables)
+                if confidence >= self.min_confidence:
+                    return self._count(db_type, table)
+
+        match = _TOP_BY_PATTERN.match(text)
+        if match:
+            table, table_confidence = resolve_name(match.group("table"), tables)
+            if table_confidence >= self.min_confidence:
+                column, column_confidence = resolve_name(match.group("column"), columns_of(table))
+                if column_confidence >= self.min_confidence:
+                    descending = match.group("direction") in ("top", "last")
+                    if match.group("order"):
+                        descending = match.group("order").startswith("desc")
+                    return self._top(db_type, table, int(match.group("n")), column, descending)
+
+        match = _FIRST_N_PATTERN.match(text)
+        if match:
+            table, confidence = resolve_name(match.group("table"), tables)
+            if confidence >= self.min_confidence:
+                return self._top(db_type, table, int(match.group("n")), None, False)
+
+        match = _AGGREGATE_PATTERN.match(text)
+        if match:
+            table, table_confidence = resolve_name(match.group("table"), tables)
+            if table_confidence >= self.min_confidence:
+                column, column_confidence = resolve_name(match.group("column"), columns_of(table))
+                if column_confidence >= self.min_confidence:
+                    return self._aggregate(db_type, table, _SQL_FUNCTIONS[match.group("func")], column)
+        return None
+
+    @staticmethod
+    def _count(db_type: str, table: str) -> str:
+        if db_type == "mongodb":
+            return json.dumps({"collection": table, "operation": "count", "filter": {}})
+        return f"SELECT COUNT(*) AS count FROM {_quote(db_type, table)};"
+
+    @staticmethod
+    def _top(db_type: str, table: str, limit: int, column: Optional[str], descending: bool) -> str:
+        if db_type == "mongodb":
+            query = {"collection": table, "operation": "find", "filter": {}, "limit": limit}
+            if column:
+                query["sort"] = {column: -1 if descending else 1}
+            return json.dumps(query)
+        sql = f"SELECT * FROM {_quote(db_type, table)}"
+        if column:
+            sql += f" ORDER BY {_quote(db_type, column)} {'DESC' if descending else 'ASC'}"
+        return sql + f" LIMIT {limit};"
+
+    @staticmethod
+    def _aggregate(db_type: str, table: str, function: str, column: str) -> str:
+        alias = f"{function.lower()}_{column}"
+        if db_type == "mongodb":
+            return json.dumps({
+                "collection": table,
+                "operation": "aggregate",
+                "pipeline": [{"$group": {"_id": None, alias: {f"${function.lower()}": f"${column}"}}}],
+            })
+        return (f"SELECT {function}({_quote(db_type, column)}) AS {_quote(db_type, alias)} "
+                f"FROM {_quote(db_type, table)};")
+
+    def record_llm_latency(self, llm_ms: float) -> None:
+        """Track latency of real LLM calls so hits can be reported as time saved"""
+        with self._lock:
+            self.stats["llm_calls"] += 1
+            self.stats["llm_ms_total"] += llm_ms
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            hits, misses = self.stats["hits"], self.stats["misses"]
+            # Misses also include generated-query cache hits and coalesced followers,
+            # so average over the LLM calls actually made
+            llm_calls = self.stats["llm_calls"]
+            average_llm_ms = self.stats["llm_ms_total"] / llm_calls if llm_calls else None
+            return {
+                "hits": hits,
+                "misses": misses,
+                "llm_calls": llm_calls,
+                "hit_ratio": hits / (hits + misses) if hits + misses else 0.0,
+                "avg_llm_ms": average_llm_ms,
+                "estimated_llm_ms_saved": hits * average_llm_ms if average_llm_ms else None,
+            }
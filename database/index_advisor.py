@@ -0,0 +1,173 @@
+# database/index_advisor.py
+import json
+import re
+from typing import Dict, Any, Optional, List
+
+from .query_history import QueryHistory, is_read_query
+
+MAX_INDEX_COLUMNS = 3
+
+_SQL_KEYWORDS = {
+    "where", "on", "join", "inner", "left", "right", "full", "outer", "cross", "group",
+    "order", "limit", "having", "union", "using", "natural", "set", "values", "offset",
+}
+_TABLE_REF = re.compile(r"\b(?:from|join)\s+([`\"\w.]+)(?:\s+(?:as\s+)?([`\"\w]+))?", re.IGNORECASE)
+_COLUMN = r"((?:[`\"\w]+\.)?[`\"\w]+)"
+_EQUALITY = re.compile(_COLUMN + r"\s*(?:=|\bin\b|\bis\b)", re.IGNORECASE)
+# Right-hand side of a join predicate, e.g. the o.customer_id in "c.id = o.customer_id"
+_JOIN_RHS = re.compile(r"=\s*([`\"\w]+\.[`\"\w]+)")
+_RANGE = re.compile(_COLUMN + r"\s*(?:<=|>=|<>|!=|<|>|\blike\b|\bbetween\b)", re.IGNORECASE)
+_CLAUSE = re.compile(
+    r"\b(where|on|order\s+by)\b(.*?)(?=\b(?:where|join|inner|left|right|group\s+by|order\s+by"
+    r"|limit|having|union|offset)\b|$)",
+    re.IGNORECASE | re.DOTALL
+)
+
+
+def _strip_identifier(name: str) -> str:
+    return name.strip('`"').split('.')[-1].strip('`"')
+
+
+def sql_candidate_columns(query: str) -> Dict[Optional[str], List[str]]:
+    """
+    Columns a query filters, joins or sorts on, keyed by table name
+    (None for unqualified columns). Equality columns come first, then
+    range columns, then ORDER BY columns, the usual composite index order.
+    """
+    aliases = {}
+    for table, alias in _TABLE_REF.findall(query):
+        table = _strip_identifier(table)
+        aliases[table] = table
+        if alias and alias.strip('`"').lower() not in _SQL_KEYWORDS:
+            aliases[alias.strip('`"')] = table
+
+    equality, ranges, ordering = [], [], []
+    for clause, body in _CLAUSE.findall(query):
+        body = re.sub(r"'(?:[^']|'')*'", "''", body)
+        if clause.lower().startswith("order"):
+            ordering.extend(part.split()[0] for part in body.split(",") if part.strip())
+        else:
+            equality.extend(_EQUALITY.findall(body))
+            equality.extend(_JOIN_RHS.findall(body))
+            ranges.extend(_RANGE.findall(body))
+
+    candidates: Dict[Optional[str], List[str]] = {}
+    for ref in equality + ranges + ordering:
+        if "." in ref:
+            qualifier, column = ref.rsplit(".", 1)
+            table = aliases.get(qualifier.strip('`"'), qualifier.strip('`"'))
+        else:
+            table, column = None, ref
+        column = column.strip('`"')
+        if not re.match(r"^[A-Za-z_]\w*$", column):
+            continue
+        columns = candidates.setdefault(table, [])
+        if column not in columns:
+            columns.append(column)
+    return candidates
+
+
+def mongo_candidate_fields(query: str) -> Dict[Optional[str], List[str]]:
+    """Fields a find/aggregate query filters and sorts on, keyed by collection"""
+    query_dict = json.loads(query)
+    if query_dict.get("operation") == "aggregate":
+        pipeline = query_dict.get("pipeline", [])
+        # Only a leading $match (and a $sort right after it) can use an index
+        filter_dict = pipeline[0].get("$match", {}) if pipeline else {}
+        sort_dict = pipeline[1].get("$sort", {}) if len(pipeline) > 1 and filter_dict else {}
+    else:
+        filter_dict = query_dict.get("filter", {})
+        sort_dict = query_dict.get("sort", {})
+
+    fields = []
+
+    def collect(document):
+        for key, value in document.items():
+            if key in ("$and", "$or", "$nor") and isinstance(value, list):
+                for clause in value:
+                    collect(clause)
+            elif not key.startswith("$") and key not in fields:
+                fields.append(key)
+
+    collect(filter_dict)
+    fields.extend(key for key in sort_dict if key not in fields)
+    return {query_dict.get("collection"): fields}
+
+
+def index_statement(db_type: str, table: str, columns: List[str]) -> str:
+    """DDL (or shell command for MongoDB) that creates the suggested index"""
+    name = f"idx_{table}_{'_'.join(columns)}"[:63]
+    if db_type == "mongodb":
+        keys = ", ".join(f'"{column}": 1' for column in columns)
+        return f'db.{table}.createIndex({{{keys}}})'
+    if db_type == "mysql":
+        column_list = ", ".join(f"`{column}`" for column in columns)
+        return f"CREATE INDEX `{name}` ON `{table}` ({column_list});"
+    column_list = ", ".join(f'"{column}"' for column in columns)
+    return f'CREATE INDEX "{name}" ON "{table}" ({column_list});'
+
+
+class IndexAdvisor:
+    """Turns slow fingerprints from the query history into index suggestions"""
+
+    def __init__(self, history: QueryHistory, db_handler, db_type: str,
+                 db_name: Optional[str] = None, scope: Optional[str] = None):
+        self.history = history
+        self.db_handler = db_handler
+        self.scope = scope
+        self.db_type = db_type
+        self.db_name = db_name
+
+    def analyze(self, min_avg_ms: float = 100.0, limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        Explain the slowest query shapes and suggest indexes for their full scans
+
+        The estimated gain assumes an index lets the database read only the
+        rows the scan returns instead of every row it examines, scaled by the
+        time the fingerprint has spent so far.
+        """
+        suggestions = []
+        for group in self.history.slow_fingerprints(self.db_type, self.db_name, min_avg_ms, limit,
+                                                     scope=self.scope):
+            query = group["sample_query"]
+            if not is_read_query(query):
+                continue
+            try:
+                plan = self.db_handler.explain_query(query)
+                if self.db_type == "mongodb":
+                    candidates = mongo_candidate_fields(query)
+                else:
+                    candidates = sql_candidate_columns(query)
+            except Exception as e:
+                print(f"Error analyzing query {group['fingerprint']}: {e}")
+                continue
+
+            for scan in plan["full_scans"]:
+                table = scan["table"]
+                columns = candidates.get(table) or []
+                if not columns and len(plan["full_scans"]) == 1:
+                    columns = candidates.get(None) or []
+                if not columns:
+                    continue
+                columns = columns[:MAX_INDEX_COLUMNS]
+
+                examined, returned = scan["rows_examined"], scan["rows_returned"]
+                saving = None
+                if examined and returned is not None:
+                    saving = max(0.0, 1 - float(returned) / float(examined))
+                suggestions.append({
+                    "fingerprint": group["fingerprint"],
+                    "normalized": group["normalized"],
+                    "executions": group["executions"],
+                    "avg_ms": group["avg_ms"],
+                    "table": table,
+                    "columns": columns,
+                    "statement": index_statement(self.db_type, table, columns),
+                    "rows_examined": examined,
+                    "rows_returned": returned,
+                    "estimated_gain_ms_per_query": group["avg_ms"] * saving if saving is not None else None,
+                    "estimated_gain_ms_total": group["total_ms"] * saving if saving is not None else None,
+                })
+
+        suggestions.sort(key=lambda s: s["estimated_gain_ms_total"] or 0, reverse=True)
+        return suggestions
@@ -0,0 +1,159 @@
+# database/live_updates.py
+import json
+import queue
+import threading
+from collections import Counter
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+
+def _row_key(row) -> str:
+    return json.dumps(list(row), default=str)
+
+
+class _TableWatcher(threading.Thread):
+    """One database watch per (connection, table), fanned out to every subscriber"""
+
+    def __init__(self, hub: "ChangeHub", key: Tuple[Hashable, str], table_name: str, db_handler):
+        super().__init__(daemon=True)
+        self.hub = hub
+        self.key = key
+        self.table_name = table_name
+        self.db_handler = db_handler
+        self.stop = threading.Event()
+        self.subscribers: List[queue.Queue] = []
+        self.column_info: List[Dict[str, Any]] = []
+        self.columns: List[str] = []
+        self.rows: Optional[List[list]] = None  # current preview, None until the first read
+
+    def _take_snapshot(self, data: Dict[str, Any]) -> Tuple[list, list]:
+        """Replace the preview rows and return (inserted, deleted) against the last read"""
+        self.column_info = [{"name": col["name"], "type": col.get("type")} for col in data["columns"]]
+        self.columns = [col["name"] for col in data["columns"]]
+        rows = [list(row) for row in data["data"]]
+        previous = self.rows or []
+        counts = Counter(_row_key(row) for row in rows)
+        previous_counts = Counter(_row_key(row) for row in previous)
+        by_key = {_row_key(row): row for row in rows}
+        previous_by_key = {_row_key(row): row for row in previous}
+        inserted = [by_key[k] for k, n in (counts - previous_counts).items() for _ in range(n)]
+        deleted = [previous_by_key[k] for k, n in (previous_counts - counts).items() for _ in range(n)]
+        self.rows = rows
+        return inserted, deleted
+
+    def _to_delta(self, event: Dict[str, Any]) -> Dict[str, Any]:
+        if event["op"] == "changed":
+            # The backend re-reads the preview on its own watch connection
+            inserted, deleted = self._take_snapshot(event["data"])
+            return {"inserted": inserted, "deleted": deleted, "deleted_keys": []}
+
+        # delete/upsert carry a key: drop the rows holding it from the preview
+        for column, value in event["key"].items():
+            if column in self.columns:
+                position = self.columns.index(column)
+                self.rows = [row for row in self.rows if row[position] != value]
+        if event["op"] == "delete":
+            return {"inserted": [], "deleted": [], "deleted_keys": [event["key"]]}
+        # upsert: replace whatever row carries the same key
+        document = event["document"]
+        row = [document.get(col, "NULL") for col in self.columns]
+        self.rows.append(row)
+        return {"inserted": [row], "deleted": [], "deleted_keys": [event["key"]]}
+
+    def state(self) -> Dict[str, Any]:
+        """The whole current preview, sent to new subscribers and to ones that fell behind"""
+        return {"table": self.table_name, "snapshot": True,
+                "columns": self.column_info, "rows": list(self.rows or [])}
+
+    def _deliver(self, subscription: queue.Queue, message: Dict[str, Any]) -> None:
+        try:
+            subscription.put_nowait(message)
+        except queue.Full:
+            # A slow client missed deltas: replace its backlog with the current preview
+            with subscription.mutex:
+                subscription.queue.clear()
+            subscription.put_nowait(self.state())
+
+    def publish(self, message: Dict[str, Any]) -> None:
+        for subscription in self.subscribers:
+            self._deliver(subscription, message)
+
+    def apply(self, event: Dict[str, Any]) -> None:
+        """
+        Update the preview and notify subscribers under the hub lock, so a
+        subscriber joining concurrently sees either the state before the
+        event plus its delta, or the state after it
+        """
+        with self.hub._lock:
+            if event["op"] == "snapshot":
+                self._take_snapshot(event["data"])
+                self.publish(self.state())
+                return
+            delta = self._to_delta(event)
+            if delta["inserted"] or delta["deleted"] or delta["deleted_keys"]:
+                self.publish({"table": self.table_name, **delta})
+
+    def run(self) -> None:
+        try:
+            for event in self.db_handler.watch_table(self.table_name, self.stop, self.hub.poll_interval):
+                if self.stop.is_set():
+                    break
+                if event is None:
+                    continue
+                self.apply(event)
+        except Exception as e:
+            print(f"Error watching table {self.table_name}: {e}")
+            with self.hub._lock:
+                self.publish({"table": self.table_name, "error": str(e)})
+        finally:
+            self.hub._forget(self)
+
+
+class ChangeHub:
+    """
+    Shares one change watcher per table across all open dashboards
+
+    Subscribers first get the watcher's current preview, {"table",
+    "snapshot": True, "columns", "rows"}, read on the watch connection and
+    so never from a cache. A bounded queue of deltas follows: {"table",
+    "inserted", "deleted", "deleted_keys"} with rows in get_table_data column
+    order. A subscriber that falls behind gets a fresh snapshot instead. The
+    watcher stops when the last subscriber leaves.
+    """
+
+    def __init__(self, poll_interval: float = 2.0, max_pending: int = 100):
+        self.poll_interval = poll_interval
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._watchers: Dict[Tuple[Hashable, str], _TableWatcher] = {}
+
+    def subscribe(self, connection_key: Hashable, table_name: str, db_handler) -> queue.Queue:
+        """Start receiving deltas for a table; pair with unsubscribe"""
+        subscription = queue.Queue(maxsize=self.max_pending)
+        key = (connection_key, table_name)
+        with self._lock:
+            watcher = self._watchers.get(key)
+            if watcher is None or watcher.stop.is_set():
+                watcher = _TableWatcher(self, key, table_name, db_handler)
+                self._watchers[key] = watcher
+                watcher.start()
+            watcher.subscribers.append(subscription)
+            if watcher.rows is not None:
+                subscription.put_nowait(watcher.state())
+        return subscription
+
+    def unsubscribe(self, connection_key: Hashable, table_name: str, subscription: queue.Queue) -> None:
+        with self._lock:
+            watcher = self._watchers.get((connection_key, table_name))
+            if watcher is None:
+                return
+            if subscription in watcher.subscribers:
+                watcher.subscribers.remove(subscription)
+            if not watcher.subscribers:
+                watcher.stop.set()
+                del self._watchers[watcher.key]
+
+    def _forget(self, watcher: _TableWatcher) -> None:
+        with self._lock:
+            watcher.stop.set()
+            if self._watchers.get(watcher.key) is watcher:
+                del self._watchers[watcher.key]
@@ -1,6 +1,10 @@
 from pymongo import MongoClient
-from typing import Dict, Any, Optional
+from pymongo.errors import BulkWriteError, OperationFailure
+from typing import Dict, Any, Optional, Iterator
+import json
+import threading
 import pandas as pd
+from .bulk_io import DEFAULT_BATCH_SIZE, encode_rows, normalize_format, read_documents
 
 class MongoDatabase:
     def __init__(self):
@@ -59,8 +63,8 @@ class MongoDatabase:
     def get_table_data(self, table_name: str) -> Dict[str, Any]:
         """Get data from a specific collection"""
         try:
-            # Get documents
-            cursor = self.db[table_name].find().limit(100)
+            # Get documents, ordered by _id so repeated reads are stable
+            cursor = self.db[table_name].find().sort("_id", 1).limit(100)
             documents = list(cursor)
             
             # Convert to pandas DataFrame for easier handling
@@ -108,8 +112,13 @@ class MongoDatabase:
             "data": []
                 }
 
-    def execute_query(self, query: str) -> Dict[str, Any]:
-        """Execute a MongoDB query and return results"""
+    def execute_query(self, query: str, query_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Execute a MongoDB query and return results
+
+        A query_id is attached as the operation comment so
+        cancel_query(query_id) can find and kill exactly this query.
+        """
         try:
             print(query)
             # Convert natural language to MongoDB query using OpenAI
@@ -125,10 +134,26 @@ class MongoDatabase:
             
             collection = self.db[collection_name]
             
-            if operation == "find":
-                filter_dict = query_dict.get("filter", {})
-                projection = query_dict.get("projection", None)
-                cursor = collection.find(filter_dict, projection)
+            if operation == "count":
+                options = {"comment": query_id} if query_id else {}
+                count = collection.count_documents(query_dict.get("filter", {}), **options)
+                return {
+                    "columns": ["count"],
+                    "results": [(count,)]
+                }
+
+            if operation in ("find", "aggregate"):
+                options = {"comment": query_id} if query_id else {}
+                if operation == "find":
+                    filter_dict = query_dict.get("filter", {})
+                    projection = query_dict.get("projection", None)
+                    cursor = collection.find(filter_dict, projection, **options)
+                    if query_dict.get("sort"):
+                        cursor = cursor.sort(list(query_dict["sort"].items()))
+                    if query_dict.get("limit"):
+                        cursor = cursor.limit(int(query_dict["limit"]))
+                else:
+                    cursor = collection.aggregate(query_dict.get("pipeline", []), **options)
                 documents = list(cursor)
                 
                 # Convert to pandas DataFrame
@@ -147,4 +172,200 @@ class MongoDatabase:
                 raise ValueError(f"Unsupported operation: {operation}")
                 
         except Exception as e:
-            raise Exception(f"Query execution error: {str(e)}")
\ No newline at end of file
+            raise Exception(f"Query execution error: {str(e)}")
+
+    def _export_cursor(self, table_name: Optional[str], query: Optional[str], batch_size: int):
+        """Open a batched cursor over a collection or a find/aggregate query"""
+        if table_name:
+            return self.db[table_name].find(batch_size=batch_size)
+        if not query:
+            raise ValueError("Either a collection name or a query is required")
+
+        query_dict = json.loads(query)
+        collection_name = query_dict.get("collection")
+        operation = query_dict.get("operation")
+        if not collection_name or not operation:
+            raise ValueError("Query must specify collection and operation")
+
+        collection = self.db[collection_name]
+        if operation == "find":
+            return collection.find(query_dict.get("filter", {}), query_dict.get("projection"),
+                                   batch_size=batch_size)
+        if operation == "aggregate":
+            return collection.aggregate(query_dict.get("pipeline", []), batchSize=batch_size,
+                                        allowDiskUse=True)
+        raise ValueError(f"Unsupported operation: {operation}")
+
+    def export_data(self, table_name: Optional[str] = None, query: Optional[str] = None,
+                    fmt: str = "csv", batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[bytes]:
+        """Stream a collection or query result in the requested format"""
+        fmt = normalize_format(fmt)
+        cursor = self._export_cursor(table_name, query, batch_size)
+        return self._export_documents(cursor, fmt, batch_size)
+
+    def _export_documents(self, cursor, fmt: str, batch_size: int) -> Iterator[bytes]:
+        try:
+            first = [doc for _, doc in zip(range(batch_size), cursor)]
+            # Columns come from the first batch; later-only fields are dropped from
+            # tabular formats, NDJSON keeps whole documents
+            columns = list(dict.fromkeys(key for doc in first for key in doc))
+
+            if fmt == "ndjson":
+                for batch in self._document_batches(first, cursor, batch_size):
+                    yield ("\n".join(json.dumps(doc, default=str) for doc in batch) + "\n").encode("utf-8")
+                return
+
+            batches = (
+                [tuple(self._export_value(doc.get(col)) for col in columns) for doc in batch]
+                for batch in self._document_batches(first, cursor, batch_size)
+            )
+            # Field types vary between documents, so Parquet columns are widened to strings
+            yield from encode_rows(columns, batches, fmt, ["string"] * len(columns))
+        finally:
+            cursor.close()
+
+    @staticmethod
+    def _document_batches(first: list, cursor, batch_size: int):
+        batch = first
+        while batch:
+            yield batch
+            batch = [doc for _, doc in zip(range(batch_size), cursor)]
+
+    @staticmethod
+    def _export_value(value):
+        """Flatten BSON values (ObjectId, nested docs, arrays) for tabular formats"""
+        if value is None or isinstance(value, (str, int, float, bool)):
+            return value
+        if isinstance(value, (dict, list)):
+            return json.dumps(value, default=str)
+        return str(value)
+
+    def import_data(self, table_name: str, stream, fmt: str = "csv",
+                    batch_size: int = DEFAULT_BATCH_SIZE) -> Dict[str, Any]:
+        """Bulk load a CSV, gzip-CSV, NDJSON or Parquet stream into a collection"""
+        fmt = normalize_format(fmt)
+        collection = self.db[table_name]
+        inserted = 0
+        errors = 0
+        for documents in read_documents(stream, fmt, batch_size):
+            try:
+                # Unordered inserts let the server parallelise and skip bad documents
+                result = collection.insert_many(documents, ordered=False)
+                inserted += len(result.inserted_ids)
+            except BulkWriteError as e:
+                inserted += e.details.get("nInserted", 0)
+                errors += len(e.details.get("writeErrors", []))
+        return {"table": table_name, "rows": inserted, "errors": errors}
+
+    def explain_query(self, query: str) -> Dict[str, Any]:
+        """
+        Run explain with executionStats for a find/aggregate query and
+        summarise collection scans. Unlike SQL EXPLAIN this executes the query.
+        """
+        query_dict = json.loads(query)
+        collection_name = query_dict.get("collection")
+        operation = query_dict.get("operation")
+        if operation == "find":
+            command = {"find": collection_name, "filter": query_dict.get("filter", {})}
+            if query_dict.get("projection"):
+                command["projection"] = query_dict["projection"]
+        elif operation == "aggregate":
+            command = {"aggregate": collection_name, "pipeline": query_dict.get("pipeline", []),
+                       "cursor": {}}
+        else:
+            raise ValueError(f"Unsupported operation: {operation}")
+
+        try:
+            plan = self.db.command({"explain": command, "verbosity": "executionStats"})
+        except Exception as e:
+            raise Exception(f"Explain error: {str(e)}")
+
+        # Aggregations nest the find plan under the first $cursor stage
+        stats = plan.get("executionStats")
+        planner = plan.get("queryPlanner")
+        for stage in plan.get("stages", []):
+            if "$cursor" in stage:
+                stats = stage["$cursor"].get("executionStats", stats)
+                planner = stage["$cursor"].get("queryPlanner", planner)
+        stats = stats or {}
+
+        scans = []
+        stages = [(planner or {}).get("winningPlan", {})]
+        while stages:
+            stage = stages.pop()
+            stages.extend(stage.get("inputStages", []))
+            if "inputStage" in stage:
+                stages.append(stage["inputStage"])
+            if "queryPlan" in stage:
+                stages.append(stage["queryPlan"])
+            if stage.get("stage") == "COLLSCAN":
+                scans.append({
+                    "table": collection_name,
+                    "rows_examined": stats.get("totalDocsExamined"),
+                    "rows_returned": stats.get("nReturned"),
+                })
+        return {"full_scans": scans, "cost": stats.get("executionTimeMillis"), "plan": plan}
+
+    def watch_table(self, table_name: str, stop: threading.Event,
+                    poll_interval: float = 2.0) -> Iterator[Optional[Dict[str, Any]]]:
+        """
+        Yield {"op": "snapshot", "data": ...} once, then row-level changes from
+        a change stream, None while idle
+
+        Events are {"op": "upsert", "key": ..., "document": ...} or
+        {"op": "delete", "key": ...}, with values stringified the way
+        get_table_data does. Deployments without change streams (standalone
+        servers) fall back to {"op": "changed", "data": ...} every poll_interval.
+        MongoClient is thread-safe, so previews are re-read on the shared client.
+        """
+        yield {"op": "snapshot", "data": self.get_table_data(table_name)}
+        try:
+            stream = self.db[table_name].watch(full_document="updateLookup", max_await_time_ms=1000)
+        except OperationFailure:
+            while not stop.wait(poll_interval):
+                yield {"op": "changed", "data": self.get_table_data(table_name)}
+            return
+
+        with stream:
+            while not stop.is_set() and stream.alive:
+                change = stream.try_next()
+                if change is None:
+                    yield None
+                    continue
+                operation = change["operationType"]
+                key = {"_id": str(change.get("documentKey", {}).get("_id"))}
+                if operation in ("insert", "update", "replace") and change.get("fullDocument"):
+                    document = {k: str(v) if v is not None else "NULL"
+                                for k, v in change["fullDocument"].items()}
+                    yield {"op": "upsert", "key": key, "document": document}
+                elif operation == "delete":
+                    yield {"op": "delete", "key": key}
+                else:
+                    # drop, rename, invalidate: let the caller resynchronise
+                    yield {"op": "changed", "data": self.get_table_data(table_name)}
+
+    def estimate_rows(self, table_name: str) -> Optional[float]:
+        """Document count from collection metadata, without scanning"""
+        try:
+            return float(self.db[table_name].estimated_document_count()) or None
+        except Exception as e:
+            print(f"Error estimating rows: {e}")
+            return None
+
+    def cancel_query(self, query_id: str) -> bool:
+        """Kill the operation started with execute_query(query, query_id)"""
+        if not self.client:
+            return False
+        try:
+            operations = self.client.admin.aggregate([
+                {"$currentOp": {}},
+                {"$match": {"command.comment": query_id}},
+            ])
+            killed = False
+            for operation in operations:
+                self.client.admin.command("killOp", op=operation["opid"])
+                killed = True
+            return killed
+        except Exception as e:
+            print(f"Error cancelling query: {e}")
+            return False
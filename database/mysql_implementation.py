@@ -1,21 +1,42 @@
 from flask import Flask, request, jsonify
-from mysql.connector import connect, Error
-from typing import Dict, Any, Optional
+from mysql.connector import connect, Error, FieldFlag, FieldType
+from typing import Dict, Any, Optional, Iterator
+import json
+import threading
+from .bulk_io import DEFAULT_BATCH_SIZE, encode_rows, iter_fetchmany, normalize_format, read_batches
+
+# Parquet column kinds by field type; DECIMAL, TIME, BIT, JSON and text/blob
+# columns export as strings so no value is narrowed
+EXPORT_KINDS = {
+    FieldType.TINY: "int", FieldType.SHORT: "int", FieldType.INT24: "int", FieldType.LONG: "int",
+    FieldType.LONGLONG: "int", FieldType.YEAR: "int",
+    FieldType.FLOAT: "float", FieldType.DOUBLE: "float",
+    FieldType.DATE: "date", FieldType.NEWDATE: "date",
+    FieldType.DATETIME: "timestamp", FieldType.TIMESTAMP: "timestamp",
+}
 
 class MySQLDatabase:
     def __init__(self):
         self.connection = None
+        self.credentials = None
+        # Connections of queries started with a query_id, for cancel_query
+        self._running = {}
+        self._running_lock = threading.Lock()
         
+    def _open_connection(self, credentials: Dict[str, Any]):
+        return connect(
+            host=credentials.get('host', 'localhost'),
+            user=credentials.get('user'),
+            password=credentials.get('password'),
+            database=credentials.get('dbname'),
+            port=credentials.get('port', 3306)
+        )
+
     def connect(self, credentials: Dict[str, Any]) -> tuple[bool, Optional[str]]:
         """Connect to MySQL database"""
         try:
-            self.connection = connect(
-                host=credentials.get('host', 'localhost'),
-                user=credentials.get('user'),
-                password=credentials.get('password'),
-                database=credentials.get('dbname'),
-                port=credentials.get('port', 3306)
-            )
+            self.connection = self._open_connection(credentials)
+            self.credentials = credentials
             return True, None
         except Error as e:
             return False, str(e)
@@ -48,10 +69,14 @@ class MySQLDatabase:
             print(f"Error getting tables: {e}")
             return []
 
-    def get_table_data(self, table_name: str) -> Dict[str, Any]:
-        """Get data from a specific table"""
+    def get_table_data(self, table_name: str, connection=None) -> Dict[str, Any]:
+        """
+        Get the first rows of a table, ordered by its primary key or another
+        unique index so repeated reads are stable and served from the index;
+        tables without one are left unordered rather than sorted in full
+        """
         try:
-            cursor = self.connection.cursor()
+            cursor = (connection or self.connection).cursor()
             
             # Get column information
             cursor.execute("""
@@ -62,9 +87,27 @@ class MySQLDatabase:
                 ORDER BY ordinal_position
             """, (table_name,))
             columns = [(row[0], row[1]) for row in cursor.fetchall()]
+
+            cursor.execute("""
+                SELECT index_name, column_name
+                FROM information_schema.statistics
+                WHERE table_schema = DATABASE()
+                AND table_name = %s
+                AND non_unique = 0
+                ORDER BY index_name = 'PRIMARY' DESC, index_name, seq_in_index
+            """, (table_name,))
+            unique_indexes: Dict[str, list] = {}
+            for index_name, column_name in cursor.fetchall():
+                unique_indexes.setdefault(index_name, []).append(column_name)
+            # Primary key first, skipping functional indexes (no column name)
+            order_by = next(([f"`{column.replace('`', '``')}`" for column in index_columns]
+                             for index_columns in unique_indexes.values() if None not in index_columns), [])
             
             # Get table data
-            cursor.execute(f"SELECT * FROM `{table_name}` LIMIT 100")
+            query = f"SELECT * FROM `{table_name}`"
+            if order_by:
+                query += f" ORDER BY {', '.join(order_by)}"
+            cursor.execute(query + " LIMIT 100")
             rows = cursor.fetchall()
             
             cursor.close()
@@ -75,10 +118,28 @@ class MySQLDatabase:
         except Error as e:
             raise Exception(f"Error fetching table data: {str(e)}")
 
-    def execute_query(self, query: str) -> Dict[str, Any]:
-        """Execute a SQL query and return results"""
+    def execute_query(self, query: str, query_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Execute a SQL query and return results
+
+        With a query_id the query runs on its own connection, so
+        cancel_query(query_id) interrupts only this query.
+        """
+        if query_id is None:
+            return self._execute(self.connection, query)
+        conn = self._open_connection(self.credentials)
+        with self._running_lock:
+            self._running[query_id] = conn
         try:
-            cursor = self.connection.cursor()
+            return self._execute(conn, query)
+        finally:
+            with self._running_lock:
+                self._running.pop(query_id, None)
+            conn.close()
+
+    def _execute(self, connection, query: str) -> Dict[str, Any]:
+        try:
+            cursor = connection.cursor()
             cursor.execute(query)
             
             # Get results for SELECT queries
@@ -87,7 +148,7 @@ class MySQLDatabase:
                 results = cursor.fetchall()
             else:
                 # For non-SELECT queries (INSERT, UPDATE, DELETE)
-                self.connection.commit()
+                connection.commit()
                 columns = []
                 results = []
             
@@ -97,4 +158,167 @@ class MySQLDatabase:
                 "results": results
             }
         except Error as e:
-            raise Exception(f"Query execution error: {str(e)}")
\ No newline at end of file
+            raise Exception(f"Query execution error: {str(e)}")
+
+    def export_data(self, table_name: Optional[str] = None, query: Optional[str] = None,
+                    fmt: str = "csv", batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[bytes]:
+        """Stream a table or query result in the requested format"""
+        fmt = normalize_format(fmt)
+        if table_name:
+            query = f"SELECT * FROM `{table_name.replace('`', '``')}`"
+        elif not query:
+            raise ValueError("Either a table name or a query is required")
+        return self._export_rows(query, fmt, batch_size)
+
+    def _export_rows(self, query: str, fmt: str, batch_size: int) -> Iterator[bytes]:
+        # Dedicated connection: an unbuffered result would block every other
+        # query on the shared connection until it is fully read
+        conn = self._open_connection(self.credentials)
+        try:
+            conn.start_transaction(readonly=True)
+            # Unbuffered cursor: rows are read off the wire batch by batch
+            cursor = conn.cursor(buffered=False)
+            cursor.execute(query)
+            if cursor.description is None:
+                raise Exception("Export error: query returned no result set")
+            columns = [desc[0] for desc in cursor.description]
+            kinds = [
+                # BIGINT UNSIGNED can exceed int64
+                "string" if desc[1] == FieldType.LONGLONG and desc[7] & FieldFlag.UNSIGNED
+                else EXPORT_KINDS.get(desc[1], "string")
+                for desc in cursor.description
+            ]
+            yield from encode_rows(columns, iter_fetchmany(cursor, batch_size), fmt, kinds)
+        except Error as e:
+            raise Exception(f"Export error: {str(e)}")
+        finally:
+            # Closing the connection discards any unread rows
+            conn.close()
+
+    def import_data(self, table_name: str, stream, fmt: str = "csv",
+                    batch_size: int = DEFAULT_BATCH_SIZE) -> Dict[str, Any]:
+        """Bulk load a CSV, gzip-CSV, NDJSON or Parquet stream into a table"""
+        fmt = normalize_format(fmt)
+        conn = self._open_connection(self.credentials)
+        cursor = conn.cursor()
+        inserted = 0
+        try:
+            for columns, rows in read_batches(stream, fmt, batch_size):
+                column_list = ", ".join(f"`{col.replace('`', '``')}`" for col in columns)
+                placeholders = ", ".join(["%s"] * len(columns))
+                # executemany rewrites this into multi-row INSERT statements
+                cursor.executemany(
+                    f"INSERT INTO `{table_name.replace('`', '``')}` ({column_list}) VALUES ({placeholders})",
+                    rows
+                )
+                inserted += len(rows)
+            conn.commit()
+            return {"table": table_name, "rows": inserted}
+        except Error as e:
+            conn.rollback()
+            raise Exception(f"Import error: {str(e)}")
+        finally:
+            cursor.close()
+            conn.close()
+
+    def explain_query(self, query: str) -> Dict[str, Any]:
+        """Estimated plan for a query, summarising full table scans (does not execute it)"""
+        try:
+            cursor = self.connection.cursor()
+            cursor.execute(f"EXPLAIN FORMAT=JSON {query.strip().rstrip(';')}")
+            plan = json.loads(cursor.fetchone()[0])
+            cursor.close()
+        except Error as e:
+            raise Exception(f"Explain error: {str(e)}")
+
+        scans = []
+        nodes = [plan]
+        while nodes:
+            node = nodes.pop()
+            if isinstance(node, list):
+                nodes.extend(node)
+                continue
+            if not isinstance(node, dict):
+                continue
+            nodes.extend(node.values())
+            if node.get("access_type") == "ALL" and "table_name" in node:
+                examined = node.get("rows_examined_per_scan")
+                filtered = float(node.get("filtered", 100))
+                scans.append({
+                    "table": node["table_name"],
+                    "rows_examined": examined,
+                    "rows_returned": examined * filtered / 100 if examined is not None else None,
+                })
+        cost = plan.get("query_block", {}).get("cost_info", {}).get("query_cost")
+        return {"full_scans": scans, "cost": float(cost) if cost else None, "plan": plan}
+
+    def watch_table(self, table_name: str, stop: threading.Event,
+                    poll_interval: float = 2.0) -> Iterator[Optional[Dict[str, Any]]]:
+        """
+        Yield {"op": "snapshot", "data": ...} once, then {"op": "changed", "data": ...}
+        whenever the table may have changed, None while idle
+
+        Polls UPDATE_TIME and TABLE_ROWS from information_schema and re-reads
+        the preview on a dedicated connection, since mysql-connector
+        connections are not thread-safe. CHECKSUM TABLE is avoided because
+        it scans InnoDB tables.
+        """
+        conn = self._open_connection(self.credentials)
+        conn.autocommit = True
+        try:
+            cursor = conn.cursor()
+            try:
+                # MySQL 8 caches table statistics for a day by default
+                cursor.execute("SET SESSION information_schema_stats_expiry = 0")
+            except Error:
+                pass
+            yield {"op": "snapshot", "data": self.get_table_data(table_name, conn)}
+            last = None
+            while not stop.is_set():
+                cursor.execute("""
+                    SELECT UPDATE_TIME, TABLE_ROWS
+                    FROM information_schema.tables
+                    WHERE table_schema = DATABASE() AND table_name = %s
+                """, (table_name,))
+                state = cursor.fetchone()
+                if last is not None and state != last:
+                    yield {"op": "changed", "data": self.get_table_data(table_name, conn)}
+                last = state
+                stop.wait(poll_interval)
+                yield None
+        finally:
+            conn.close()
+
+    def estimate_rows(self, table_name: str) -> Optional[float]:
+        """Row estimate from information_schema, without scanning the table"""
+        try:
+            cursor = self.connection.cursor()
+            cursor.execute("""
+                SELECT TABLE_ROWS
+                FROM information_schema.tables
+                WHERE table_schema = DATABASE() AND table_name = %s
+            """, (table_name.strip("`"),))
+            row = cursor.fetchone()
+            cursor.close()
+            return float(row[0]) if row and row[0] else None
+        except Error as e:
+            print(f"Error estimating rows: {e}")
+            return None
+
+    def cancel_query(self, query_id: str) -> bool:
+        """Cancel a query started with execute_query(query, query_id) using KILL QUERY from a second connection"""
+        with self._running_lock:
+            target = self._running.get(query_id)
+        if target is None:
+            return False
+        try:
+            conn = self._open_connection(self.credentials)
+            try:
+                cursor = conn.cursor()
+                cursor.execute(f"KILL QUERY {int(target.connection_id)}")
+            finally:
+                conn.close()
+            return True
+        except Error as e:
+            print(f"Error cancelling query: {e}")
+            return False
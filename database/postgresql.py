@@ -1,23 +1,63 @@
 # postgresql.py
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Iterator
+import csv
+import gzip
+import select
+import threading
+import uuid
 import psycopg2
 from psycopg2 import sql
-from psycopg2.extras import DictCursor
+from psycopg2.extras import DictCursor, execute_values
+from .bulk_io import (DEFAULT_BATCH_SIZE, encode_rows, gzip_chunks, iter_fetchmany,
+                      normalize_format, read_batches, stream_from_writer)
+
+NOTIFY_CHANNEL = "talk_to_db_changes"
+
+# Optional statement-level trigger, installed per table with install_change_trigger;
+# when present, live dashboards are woken by NOTIFY instead of polling table statistics
+NOTIFY_TRIGGER_SQL = """
+CREATE OR REPLACE FUNCTION talk_to_db_notify() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('talk_to_db_changes', TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS talk_to_db_notify ON {table};
+CREATE TRIGGER talk_to_db_notify
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table}
+FOR EACH STATEMENT EXECUTE FUNCTION talk_to_db_notify();
+"""
+
+# Parquet column kinds by type OID; numeric, json, uuid, time, interval and
+# arrays export as strings so no value is narrowed
+EXPORT_KINDS = {
+    16: "bool", 17: "binary", 20: "int", 21: "int", 23: "int", 26: "int",
+    700: "float", 701: "float", 1082: "date", 1114: "timestamp", 1184: "timestamptz",
+}
 
 class PostgreSQLDatabase:
     def __init__(self):
         self.connection = None
+        self.credentials = None
+        # Connections of queries started with a query_id, for cancel_query
+        self._running = {}
+        self._running_lock = threading.Lock()
         
+    def _open_connection(self, credentials: Dict[str, Any]):
+        return psycopg2.connect(
+            dbname=credentials.get('dbname'),
+            user=credentials.get('user'),
+            password=credentials.get('password'),
+            host=credentials.get('host', 'localhost'),
+            port=credentials.get('port', 5432)
+        )
+
     def connect(self, credentials: Dict[str, Any]) -> tuple[bool, Optional[str]]:
         """Connect to PostgreSQL database"""
         try:
-            self.connection = psycopg2.connect(
-                dbname=credentials.get('dbname'),
-                user=credentials.get('user'),
-                password=credentials.get('password'),
-                host=credentials.get('host', 'localhost'),
-                port=credentials.get('port', 5432)
-            )
+            self.connection = self._open_connection(credentials)
+            self.credentials = credentials
             return True, None
         except psycopg2.Error as e:
             return False, str(e)
@@ -50,10 +90,14 @@ class PostgreSQLDatabase:
             print(f"Error getting tables: {e}")
             return []
 
-    def get_table_data(self, table_name: str) -> Dict[str, Any]:
-        """Get data from a specific table"""
+    def get_table_data(self, table_name: str, connection=None) -> Dict[str, Any]:
+        """
+        Get the first rows of a table, ordered by its primary key or another
+        unique index so repeated reads are stable and served from the index;
+        tables without one are left unordered rather than sorted in full
+        """
         try:
-            cursor = self.connection.cursor()
+            cursor = (connection or self.connection).cursor()
             
             # Get column information
             cursor.execute("""
@@ -64,12 +108,31 @@ class PostgreSQLDatabase:
                 ORDER BY ordinal_position;
             """, (table_name,))
             columns = [(row[0], row[1]) for row in cursor.fetchall()]
+
+            # Key columns of the primary key, else the first plain unique index
+            cursor.execute("""
+                SELECT a.attname
+                FROM (
+                    SELECT indexrelid, indrelid, indkey, indnkeyatts
+                    FROM pg_index
+                    WHERE indrelid = to_regclass(quote_ident('public') || '.' || quote_ident(%s))
+                    AND indisunique AND indisvalid
+                    AND indpred IS NULL AND indexprs IS NULL
+                    ORDER BY indisprimary DESC, indexrelid
+                    LIMIT 1
+                ) i
+                CROSS JOIN LATERAL unnest(i.indkey::int2[]) WITH ORDINALITY AS k(attnum, position)
+                JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = k.attnum
+                WHERE k.position <= i.indnkeyatts
+                ORDER BY k.position;
+            """, (table_name,))
+            order_by = [sql.Identifier(row[0]) for row in cursor.fetchall()]
             
             # Get table data
-            query = sql.SQL("SELECT * FROM {} LIMIT 100").format(
-                sql.Identifier(table_name)
-            )
-            cursor.execute(query)
+            query = sql.SQL("SELECT * FROM {}").format(sql.Identifier(table_name))
+            if order_by:
+                query += sql.SQL(" ORDER BY {}").format(sql.SQL(", ").join(order_by))
+            cursor.execute(query + sql.SQL(" LIMIT 100"))
             rows = cursor.fetchall()
             
             cursor.close()
@@ -80,10 +143,28 @@ class PostgreSQLDatabase:
         except psycopg2.Error as e:
             raise Exception(f"Error fetching table data: {str(e)}")
 
-    def execute_query(self, query: str) -> Dict[str, Any]:
-        """Execute a SQL query and return results"""
+    def execute_query(self, query: str, query_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Execute a SQL query and return results
+
+        With a query_id the query runs on its own connection, so
+        cancel_query(query_id) interrupts only this query.
+        """
+        if query_id is None:
+            return self._execute(self.connection, query)
+        conn = self._open_connection(self.credentials)
+        with self._running_lock:
+            self._running[query_id] = conn
         try:
-            cursor = self.connection.cursor()
+            return self._execute(conn, query)
+        finally:
+            with self._running_lock:
+                self._running.pop(query_id, None)
+            conn.close()
+
+    def _execute(self, connection, query: str) -> Dict[str, Any]:
+        try:
+            cursor = connection.cursor()
             cursor.execute(query)
             
             # Get results for SELECT queries
@@ -92,7 +173,7 @@ class PostgreSQLDatabase:
                 results = cursor.fetchall()
             else:
                 # For non-SELECT queries (INSERT, UPDATE, DELETE)
-                self.connection.commit()
+                connection.commit()
                 columns = []
                 results = []
             
@@ -112,4 +193,224 @@ class PostgreSQLDatabase:
             cursor.close()
             return True
         except (psycopg2.Error, AttributeError):
-            return False
\ No newline at end of file
+            return False
+
+    def _export_source(self, table_name: Optional[str], query: Optional[str]) -> sql.Composable:
+        """Build the relation or sub-query an export reads from"""
+        if table_name:
+            return sql.SQL("SELECT * FROM {}").format(sql.Identifier(table_name))
+        if query:
+            return sql.SQL(query.strip().rstrip(';'))
+        raise ValueError("Either a table name or a query is required")
+
+    def export_data(self, table_name: Optional[str] = None, query: Optional[str] = None,
+                    fmt: str = "csv", batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[bytes]:
+        """Stream a table or query result in the requested format"""
+        fmt = normalize_format(fmt)
+        source = self._export_source(table_name, query)
+
+        if fmt in ("csv", "csv.gz"):
+            # COPY streams rows straight out of the server's CSV encoder
+            copy_sql = sql.SQL("COPY ({}) TO STDOUT WITH CSV HEADER").format(source)
+
+            def write(f):
+                conn = self._open_export_connection()
+                try:
+                    with conn.cursor() as cursor:
+                        cursor.copy_expert(copy_sql, f, size=1024 * 1024)
+                finally:
+                    conn.close()
+
+            chunks = stream_from_writer(write)
+            return gzip_chunks(chunks) if fmt == "csv.gz" else chunks
+
+        return self._export_rows(source, fmt, batch_size)
+
+    def _open_export_connection(self):
+        """
+        Dedicated read-only connection per export, so a long COPY or named
+        cursor neither holds the shared connection's lock nor dies when
+        another request commits on it
+        """
+        conn = self._open_connection(self.credentials)
+        conn.set_session(readonly=True)
+        return conn
+
+    def _export_rows(self, source: sql.Composable, fmt: str, batch_size: int) -> Iterator[bytes]:
+        conn = self._open_export_connection()
+        # Named (server-side) cursor so rows arrive batch by batch
+        cursor = conn.cursor(name=f"export_{uuid.uuid4().hex}")
+        cursor.itersize = batch_size
+        try:
+            cursor.execute(source)
+            first = cursor.fetchmany(batch_size)
+            columns = [desc[0] for desc in cursor.description]
+            kinds = [EXPORT_KINDS.get(desc[1], "string") for desc in cursor.description]
+
+            def batches():
+                if first:
+                    yield first
+                yield from iter_fetchmany(cursor, batch_size)
+
+            yield from encode_rows(columns, batches(), fmt, kinds)
+        except psycopg2.Error as e:
+            raise Exception(f"Export error: {str(e)}")
+        finally:
+            conn.close()
+
+    def import_data(self, table_name: str, stream, fmt: str = "csv",
+                    batch_size: int = DEFAULT_BATCH_SIZE) -> Dict[str, Any]:
+        """Bulk load a CSV, gzip-CSV, NDJSON or Parquet stream into a table"""
+        fmt = normalize_format(fmt)
+        # Own connection: a long COPY FROM must not block or be committed by other requests
+        conn = self._open_connection(self.credentials)
+        cursor = conn.cursor()
+        try:
+            if fmt in ("csv", "csv.gz"):
+                # COPY FROM reads the rest of the upload in chunks after the header row
+                if fmt == "csv.gz":
+                    stream = gzip.GzipFile(fileobj=stream, mode="rb")
+                header = stream.readline().decode("utf-8-sig")
+                columns = next(csv.reader([header]), None)
+                if not columns:
+                    return {"table": table_name, "rows": 0}
+                copy_sql = sql.SQL("COPY {} ({}) FROM STDIN WITH CSV").format(
+                    sql.Identifier(table_name),
+                    sql.SQL(", ").join(map(sql.Identifier, columns))
+                )
+                cursor.copy_expert(copy_sql, stream, size=1024 * 1024)
+                inserted = cursor.rowcount
+            else:
+                inserted = 0
+                for columns, rows in read_batches(stream, fmt, batch_size):
+                    insert_sql = sql.SQL("INSERT INTO {} ({}) VALUES %s").format(
+                        sql.Identifier(table_name),
+                        sql.SQL(", ").join(map(sql.Identifier, columns))
+                    )
+                    execute_values(cursor, insert_sql.as_string(cursor), rows, page_size=batch_size)
+                    inserted += len(rows)
+            conn.commit()
+            return {"table": table_name, "rows": inserted}
+        except psycopg2.Error as e:
+            conn.rollback()
+            raise Exception(f"Import error: {str(e)}")
+        finally:
+            cursor.close()
+            conn.close()
+
+    def explain_query(self, query: str) -> Dict[str, Any]:
+        """Estimated plan for a query, summarising sequential scans (does not execute it)"""
+        try:
+            cursor = self.connection.cursor()
+            cursor.execute(sql.SQL("EXPLAIN (FORMAT JSON) {}").format(sql.SQL(query.strip().rstrip(';'))))
+            plan = cursor.fetchone()[0][0]["Plan"]
+
+            scans = []
+            nodes = [plan]
+            while nodes:
+                node = nodes.pop()
+                nodes.extend(node.get("Plans", []))
+                if node.get("Node Type") == "Seq Scan":
+                    cursor.execute(
+                        "SELECT reltuples FROM pg_class WHERE oid = to_regclass(%s)",
+                        (node["Relation Name"],)
+                    )
+                    row = cursor.fetchone()
+                    scans.append({
+                        "table": node["Relation Name"],
+                        "rows_examined": max(row[0], 0) if row else None,
+                        "rows_returned": node.get("Plan Rows"),
+                    })
+            cursor.close()
+            return {"full_scans": scans, "cost": plan.get("Total Cost"), "plan": plan}
+        except psycopg2.Error as e:
+            self.connection.rollback()
+            raise Exception(f"Explain error: {str(e)}")
+
+    def watch_table(self, table_name: str, stop: threading.Event,
+                    poll_interval: float = 2.0) -> Iterator[Optional[Dict[str, Any]]]:
+        """
+        Yield {"op": "snapshot", "data": ...} once, then {"op": "changed", "data": ...}
+        whenever the table may have changed, None while idle
+
+        Everything, including the preview re-reads, runs on a dedicated
+        connection. Uses LISTEN if the NOTIFY trigger is installed on the
+        table, otherwise polls the write counters in pg_stat_user_tables.
+        """
+        conn = self._open_connection(self.credentials)
+        conn.autocommit = True
+        try:
+            yield {"op": "snapshot", "data": self.get_table_data(table_name, conn)}
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT 1 FROM pg_trigger WHERE tgrelid = to_regclass(%s) AND tgname = 'talk_to_db_notify'",
+                (table_name,)
+            )
+            if cursor.fetchone():
+                cursor.execute(f"LISTEN {NOTIFY_CHANNEL}")
+                while not stop.is_set():
+                    if select.select([conn], [], [], 1.0) == ([], [], []):
+                        yield None
+                        continue
+                    conn.poll()
+                    payloads = {notify.payload for notify in conn.notifies}
+                    conn.notifies.clear()
+                    if table_name in payloads:
+                        yield {"op": "changed", "data": self.get_table_data(table_name, conn)}
+                    else:
+                        yield None
+            else:
+                last = None
+                while not stop.is_set():
+                    cursor.execute(
+                        """SELECT n_tup_ins + n_tup_upd + n_tup_del
+                           FROM pg_stat_user_tables WHERE relid = to_regclass(%s)""",
+                        (table_name,)
+                    )
+                    row = cursor.fetchone()
+                    counters = row[0] if row else None
+                    if last is not None and counters != last:
+                        yield {"op": "changed", "data": self.get_table_data(table_name, conn)}
+                    last = counters
+                    stop.wait(poll_interval)
+                    yield None
+        finally:
+            conn.close()
+
+    def install_change_trigger(self, table_name: str) -> None:
+        """Install the NOTIFY trigger on a table so live dashboards stop polling it"""
+        try:
+            cursor = self.connection.cursor()
+            cursor.execute(sql.SQL(NOTIFY_TRIGGER_SQL).format(table=sql.Identifier(table_name)))
+            self.connection.commit()
+            cursor.close()
+        except psycopg2.Error as e:
+            self.connection.rollback()
+            raise Exception(f"Error installing change trigger: {str(e)}")
+
+    def estimate_rows(self, table_name: str) -> Optional[float]:
+        """Planner row estimate from pg_class, without scanning the table"""
+        try:
+            cursor = self.connection.cursor()
+            cursor.execute("SELECT reltuples FROM pg_class WHERE oid = to_regclass(%s)", (table_name,))
+            row = cursor.fetchone()
+            cursor.close()
+            # reltuples is -1 (or 0 on old servers) until the table is analyzed
+            return float(row[0]) if row and row[0] > 0 else None
+        except psycopg2.Error as e:
+            self.connection.rollback()
+            print(f"Error estimating rows: {e}")
+            return None
+
+    def cancel_query(self, query_id: str) -> bool:
+        """Cancel a query started with execute_query(query, query_id) (thread-safe)"""
+        with self._running_lock:
+            conn = self._running.get(query_id)
+        if conn is None:
+            return False
+        try:
+            conn.cancel()
+            return True
+        except psycopg2.Error as e:
+            print(f"Error cancelling query: {e}")
+            return False
@@ -0,0 +1,207 @@
+# database/query_history.py
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, Any, Optional, List
+
+_SQL_STRING = re.compile(r"'(?:[^']|'')*'")
+_SQL_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_SQL_IN_LIST = re.compile(r"\bin\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+# Literals, quoted identifiers and comments, removed before looking for write keywords
+_SQL_QUOTED_OR_COMMENT = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|`[^`]*`|--[^\n]*|/\*.*?\*/", re.DOTALL)
+# Data-modifying CTEs, SELECT ... INTO (tables, OUTFILE), locking reads, sequence
+# updates and stacked statements all make a SELECT/WITH a write
+_SQL_WRITE_KEYWORD = re.compile(
+    r"\b(?:insert|update|delete|merge|truncate|drop|alter|create|grant|revoke|"
+    r"into|call|lock|nextval|setval)\b|;\s*\S",
+    re.IGNORECASE
+)
+
+
+def normalize_query(query: str) -> str:
+    """
+    Reduce a query to its shape so that executions differing only in
+    literal values share a fingerprint
+    """
+    query = query.strip().rstrip(';')
+    try:
+        document = json.loads(query)
+    except ValueError:
+        document = None
+    if isinstance(document, dict):
+        # MongoDB queries are JSON documents: keep the keys, drop the values
+        return json.dumps(_normalize_document(document), sort_keys=True)
+
+    normalized = _SQL_STRING.sub("?", query)
+    normalized = _SQL_NUMBER.sub("?", normalized)
+    normalized = _SQL_IN_LIST.sub("in (?)", normalized)
+    return _WHITESPACE.sub(" ", normalized).lower()
+
+
+def _normalize_document(value, key: Optional[str] = None):
+    if isinstance(value, dict):
+        return {k: _normalize_document(v, k) for k, v in value.items()}
+    if isinstance(value, list):
+        # Pipelines are structural, value lists ($in etc.) are literals
+        if key == "pipeline":
+            return [_normalize_document(v) for v in value]
+        return ["?"]
+    if key in ("collection", "operation"):
+        return value
+    return "?"
+
+
+def is_read_query(query: str) -> bool:
+    """True for read-only SELECT/WITH statements and MongoDB find/aggregate/count queries"""
+    stripped = query.lstrip()
+    if stripped.startswith("{"):
+        try:
+            query_dict = json.loads(stripped)
+            # $out/$merge stages make an aggregate write to a collection
+            writes = any("$out" in stage or "$merge" in stage for stage in query_dict.get("pipeline", []))
+            return query_dict.get("operation") in ("find", "aggregate", "count") and not writes
+        except (ValueError, AttributeError, TypeError):
+            return False
+    if not stripped.lower().startswith(("select", "with")):
+        return False
+    # Anything ambiguous goes down the write path: not cached, not coalesced
+    code = _SQL_QUOTED_OR_COMMENT.sub(" ", stripped).rstrip().rstrip(";")
+    return not _SQL_WRITE_KEYWORD.search(code)
+
+
+def _hash(normalized: str) -> str:
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:16]
+
+
+def fingerprint(query: str) -> str:
+    """Stable short hash of a normalized query"""
+    return _hash(normalize_query(query))
+
+
+class QueryHistory:
+    """Append-only local store of generated queries and their timings"""
+
+    def __init__(self, path: str = "query_history.db"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS query_history (
+                id INTEGER PRIMARY KEY,
+                created_at REAL NOT NULL,
+                db_type TEXT NOT NULL,
+                db_name TEXT,
+                prompt TEXT,
+                query TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                normalized TEXT NOT NULL,
+                row_count INTEGER,
+                llm_ms REAL,
+                exec_ms REAL,
+                error TEXT
+            )
+        """)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(query_history)")}
+        if "scope" not in columns:
+            # Histories written before scoping keep a NULL scope and are never served
+            self._conn.execute("ALTER TABLE query_history ADD COLUMN scope TEXT")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_query_history_fingerprint "
+            "ON query_history (fingerprint, exec_ms)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_query_history_scope ON query_history (scope, id)")
+        self._conn.commit()
+
+    def record(self, db_type: str, db_name: Optional[str], prompt: Optional[str], query: str,
+               row_count: Optional[int] = None, llm_ms: Optional[float] = None,
+               exec_ms: Optional[float] = None, error: Optional[str] = None,
+               scope: Optional[str] = None) -> str:
+        """
+        Append one execution and return its fingerprint
+
+        scope identifies the server, user and database (never the password)
+        so histories of same-named databases on different hosts stay apart.
+        """
+        normalized = normalize_query(query)
+        fp = _hash(normalized)
+        with self._lock:
+            self._conn.execute(
+                """INSERT INTO query_history
+                   (created_at, db_type, db_name, prompt, query, fingerprint, normalized,
+                    row_count, llm_ms, exec_ms, error, scope)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (time.time(), db_type, db_name, prompt, query, fp, normalized,
+                 row_count, llm_ms, exec_ms, error, scope)
+            )
+            self._conn.commit()
+        return fp
+
+    def recent(self, db_type: Optional[str] = None, db_name: Optional[str] = None,
+               limit: int = 50, scope: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Most recent executions against one database, newest first"""
+        filters = []
+        params: list = []
+        if scope:
+            filters.append("scope = ?")
+            params.append(scope)
+        if db_type:
+            filters.append("db_type = ?")
+            params.append(db_type)
+        if db_name:
+            filters.append("db_name = ?")
+            params.append(db_name)
+        params.append(limit)
+
+        with self._lock:
+            cursor = self._conn.execute(
+                f"""SELECT created_at, db_type, db_name, prompt, query, fingerprint,
+                           row_count, llm_ms, exec_ms, error
+                    FROM query_history
+                    {'WHERE ' + ' AND '.join(filters) if filters else ''}
+                    ORDER BY id DESC LIMIT ?""",
+                params
+            )
+            columns = [desc[0] for desc in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def slow_fingerprints(self, db_type: Optional[str] = None, db_name: Optional[str] = None,
+                          min_avg_ms: float = 100.0, limit: int = 20,
+                          scope: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Group successful executions by fingerprint, slowest total time first"""
+        filters = ["error IS NULL", "exec_ms IS NOT NULL"]
+        params: list = []
+        if scope:
+            filters.append("scope = ?")
+            params.append(scope)
+        if db_type:
+            filters.append("db_type = ?")
+            params.append(db_type)
+        if db_name:
+            filters.append("db_name = ?")
+            params.append(db_name)
+        params.extend([min_avg_ms, limit])
+
+        with self._lock:
+            cursor = self._conn.execute(
+                f"""SELECT fingerprint, db_type, normalized, COUNT(*) AS executions,
+                           AVG(exec_ms) AS avg_ms, MAX(exec_ms) AS max_ms,
+                           SUM(exec_ms) AS total_ms, MAX(query) AS sample_query
+                    FROM query_history
+                    WHERE {' AND '.join(filters)}
+                    GROUP BY fingerprint, db_type
+                    HAVING AVG(exec_ms) >= ?
+                    ORDER BY total_ms DESC
+                    LIMIT ?""",
+                params
+            )
+            columns = [desc[0] for desc in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
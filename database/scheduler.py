@@ -0,0 +1,192 @@
+# database/scheduler.py
+import heapq
+import itertools
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Optional
+
+# Lower value runs first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_ADHOC = 1
+
+
+class AdmissionRejected(Exception):
+    """Raised when work is refused; retry_after is a hint in seconds"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Classic token bucket: rate tokens per second, up to burst"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        """Take tokens if available; otherwise return seconds until they will be"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return 0.0
+            return (tokens - self.tokens) / self.rate
+
+    def is_idle(self, now: float, idle_for: float) -> bool:
+        """True once the bucket has refilled completely and gone unused for idle_for seconds"""
+        with self._lock:
+            refilled = self.tokens + (now - self.updated) * self.rate >= self.burst
+            return refilled and now - self.updated >= idle_for
+
+
+class _Ticket:
+    def __init__(self):
+        self.granted = threading.Event()
+        self.cancelled = False
+
+
+class Scheduler:
+    """
+    Admission control in front of one shared resource (LLM or database)
+
+    Callers are charged against per-user and per-database token buckets
+    (check_rate), then work waits for one of max_concurrent slots (run).
+    The two steps are separate so coalesced callers can be rate limited
+    individually while only the shared execution takes a slot. Waiting
+    work is served by priority, FIFO within a priority, so interactive
+    dashboard reads overtake queued ad-hoc queries. Queues are bounded per priority; a full queue, an empty
+    bucket or a wait longer than max_wait is refused with a retry-after hint.
+    """
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int = 32,
+                 max_wait: float = 10.0, user_rate: float = 2.0, user_burst: float = 5.0,
+                 db_rate: float = 20.0, db_burst: float = 40.0, bucket_idle: float = 300.0):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.user_rate, self.user_burst = user_rate, user_burst
+        self.db_rate, self.db_burst = db_rate, db_burst
+        self.bucket_idle = bucket_idle
+
+        self._lock = threading.Lock()
+        self._running = 0
+        self._queue: list = []
+        self._queued_by_priority: Dict[int, int] = {}
+        self._sequence = itertools.count()
+        self._user_buckets: Dict[Hashable, TokenBucket] = {}
+        self._db_buckets: Dict[Hashable, TokenBucket] = {}
+        self._last_sweep = time.monotonic()
+
+        self._metrics = {
+            "admitted": 0, "rejected_rate": 0, "rejected_queue": 0, "timed_out": 0,
+            "wait_ms_total": 0.0, "wait_ms_max": 0.0, "queue_depth_max": 0,
+        }
+
+    def _bucket(self, buckets: Dict[Hashable, TokenBucket], key: Hashable,
+                rate: float, burst: float) -> TokenBucket:
+        with self._lock:
+            self._sweep_buckets()
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = buckets[key] = TokenBucket(rate, burst)
+            return bucket
+
+    def _sweep_buckets(self) -> None:
+        """
+        Drop idle, full buckets so one-off users don't accumulate; a new full
+        bucket behaves identically. Caller holds self._lock.
+        """
+        now = time.monotonic()
+        if now - self._last_sweep < self.bucket_idle:
+            return
+        self._last_sweep = now
+        for buckets in (self._user_buckets, self._db_buckets):
+            for key in [key for key, bucket in buckets.items() if bucket.is_idle(now, self.bucket_idle)]:
+                del buckets[key]
+
+    def check_rate(self, user_key: Optional[Hashable] = None,
+                   db_key: Optional[Hashable] = None) -> None:
+        """Charge one token to the user's and the database's bucket, or refuse"""
+        for buckets, key, rate, burst, label in (
+            (self._user_buckets, user_key, self.user_rate, self.user_burst, "user"),
+            (self._db_buckets, db_key, self.db_rate, self.db_burst, "database"),
+        ):
+            if key is None:
+                continue
+            wait = self._bucket(buckets, key, rate, burst).try_acquire()
+            if wait:
+                with self._lock:
+                    self._metrics["rejected_rate"] += 1
+                raise AdmissionRejected(f"{self.name}: {label} rate limit exceeded", wait)
+
+    def _acquire(self, priority: int) -> float:
+        """Wait for a concurrency slot and return the time spent queued in seconds"""
+        started = time.monotonic()
+        with self._lock:
+            if self._running < self.max_concurrent and not any(self._queued_by_priority.values()):
+                self._running += 1
+                return 0.0
+            if self._queued_by_priority.get(priority, 0) >= self.max_queue:
+                self._metrics["rejected_queue"] += 1
+                raise AdmissionRejected(f"{self.name}: queue is full", self._retry_hint())
+            ticket = _Ticket()
+            heapq.heappush(self._queue, (priority, next(self._sequence), ticket))
+            self._queued_by_priority[priority] = self._queued_by_priority.get(priority, 0) + 1
+            self._metrics["queue_depth_max"] = max(self._metrics["queue_depth_max"], len(self._queue))
+
+        if not ticket.granted.wait(self.max_wait):
+            with self._lock:
+                if not ticket.granted.is_set():
+                    ticket.cancelled = True
+                    self._queued_by_priority[priority] -= 1
+                    self._metrics["timed_out"] += 1
+                    raise AdmissionRejected(f"{self.name}: timed out waiting in queue",
+                                            self._retry_hint())
+        return time.monotonic() - started
+
+    def _release(self) -> None:
+        with self._lock:
+            while self._queue:
+                priority, _, ticket = heapq.heappop(self._queue)
+                if not ticket.cancelled:
+                    # Hand the slot straight to the next waiter
+                    self._queued_by_priority[priority] -= 1
+                    ticket.granted.set()
+                    return
+            self._running -= 1
+
+    def _retry_hint(self) -> float:
+        admitted = self._metrics["admitted"]
+        average_wait = self._metrics["wait_ms_total"] / admitted / 1000 if admitted else 0.0
+        return max(1.0, average_wait)
+
+    def run(self, fn: Callable[..., Any], *args, priority: int = PRIORITY_ADHOC, **kwargs) -> Any:
+        """Run fn once a concurrency slot is free, raising AdmissionRejected when it is not"""
+        waited = self._acquire(priority)
+        with self._lock:
+            self._metrics["admitted"] += 1
+            self._metrics["wait_ms_total"] += waited * 1000
+            self._metrics["wait_ms_max"] = max(self._metrics["wait_ms_max"], waited * 1000)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self._release()
+
+    def metrics(self) -> Dict[str, Any]:
+        """Snapshot of queue depth, concurrency and wait times"""
+        with self._lock:
+            admitted = self._metrics["admitted"]
+            return {
+                **self._metrics,
+                "running": self._running,
+                "queue_depth": len([t for _, _, t in self._queue if not t.cancelled]),
+                "wait_ms_avg": self._metrics["wait_ms_total"] / admitted if admitted else 0.0,
+            }
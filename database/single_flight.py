@@ -0,0 +1,74 @@
+# database/single_flight.py
+import threading
+from typing import Any, Callable, Dict, Hashable
+
+
+class SingleFlightTimeout(TimeoutError):
+    """Raised when a coalesced caller gives up waiting for the shared call"""
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls into one in-progress execution
+
+    The first caller for a key runs the function; callers arriving while it
+    is still running wait (up to timeout seconds) and receive the same
+    result, or the same exception. Results are shared objects, so callers
+    must treat them as read-only. Nothing is cached once the call finishes.
+    """
+
+    def __init__(self, timeout: float = 30.0):
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self.stats = {"executions": 0, "coalesced": 0, "timeouts": 0}
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run fn(*args, **kwargs) unless an identical call is already in flight"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self.stats["executions"] += 1
+            else:
+                call.followers += 1
+                self.stats["coalesced"] += 1
+
+        if leader:
+            try:
+                call.result = fn(*args, **kwargs)
+                return call.result
+            except Exception as e:
+                call.error = e
+                raise
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+
+        finished = call.done.wait(self.timeout)
+        with self._lock:
+            call.followers -= 1
+            if not finished:
+                self.stats["timeouts"] += 1
+        if not finished:
+            raise SingleFlightTimeout(f"Timed out after {self.timeout}s waiting for an identical request")
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def followers(self, key: Hashable) -> int:
+        """Number of callers currently waiting on the in-flight call for key"""
+        with self._lock:
+            call = self._calls.get(key)
+            return call.followers if call else 0
@@ -1,7 +1,9 @@
 import sqlite3
-from typing import Dict, Any, Optional
+import threading
+from typing import Dict, Any, Optional, Iterator
 from urllib.parse import urlparse, parse_qs
 import requests
+from .bulk_io import DEFAULT_BATCH_SIZE, encode_rows, infer_kinds, normalize_format
 
 class SQLiteDatabase:
     def __init__(self):
@@ -89,13 +91,21 @@ class SQLiteDatabase:
             print(f"Error getting tables: {e}")
             return []
 
+    def _preview_order(self, table_name: str) -> str:
+        """ORDER BY clause on the primary key (or rowid) so repeated previews are stable and indexed"""
+        info = self.execute_query(f"PRAGMA table_info({table_name})")
+        columns = [dict(zip(info["columns"], row)) for row in info["results"]]
+        keys = sorted((column for column in columns if column.get("pk")), key=lambda column: column["pk"])
+        order_by = ['"' + column["name"].replace('"', '""') + '"' for column in keys]
+        return f" ORDER BY {', '.join(order_by or ['rowid'])}"
+
     def get_table_data(self, table_name: str) -> Dict[str, Any]:
         """Get data from a specific table"""
         try:
             response = requests.post(
                 f"https://{self.host}/api/v1/databases/{self.database}/query",
                 headers={'Authorization': f'Bearer {self.api_key}'},
-                json={'query': f"SELECT * FROM {table_name} LIMIT 100"}
+                json={'query': f"SELECT * FROM {table_name}{self._preview_order(table_name)} LIMIT 100"}
             )
             
             if response.status_code != 200:
@@ -109,8 +119,8 @@ class SQLiteDatabase:
         except Exception as e:
             raise Exception(f"Error fetching table data: {str(e)}")
 
-    def execute_query(self, query: str) -> Dict[str, Any]:
-        """Execute a SQL query and return results"""
+    def execute_query(self, query: str, query_id: Optional[str] = None) -> Dict[str, Any]:
+        """Execute a SQL query and return results; query_id is unused since REST requests cannot be cancelled"""
         try:
             response = requests.post(
                 f"https://{self.host}/api/v1/databases/{self.database}/query",
@@ -127,4 +137,55 @@ class SQLiteDatabase:
                 "results": result["rows"]
             }
         except Exception as e:
-            raise Exception(f"Query execution error: {str(e)}")
\ No newline at end of file
+            raise Exception(f"Query execution error: {str(e)}")
+
+    def export_data(self, table_name: Optional[str] = None, query: Optional[str] = None,
+                    fmt: str = "csv", batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[bytes]:
+        """Export a table or query result in the requested format"""
+        fmt = normalize_format(fmt)
+        if table_name:
+            query = f'SELECT * FROM "{table_name.replace(chr(34), chr(34) * 2)}"'
+        elif not query:
+            raise ValueError("Either a table name or a query is required")
+
+        # The SQLite Cloud REST API returns the whole result in one response,
+        # so only the encoding side is streamed
+        result = self.execute_query(query)
+        rows = result["results"]
+        batches = (rows[i:i + batch_size] for i in range(0, len(rows), batch_size))
+        return encode_rows(result["columns"], batches, fmt, infer_kinds(result["columns"], rows))
+
+    def import_data(self, table_name: str, stream, fmt: str = "csv",
+                    batch_size: int = DEFAULT_BATCH_SIZE) -> Dict[str, Any]:
+        """Bulk import is not available over the SQLite Cloud REST API"""
+        raise Exception("Bulk import is not supported for SQLite Cloud databases")
+
+    def explain_query(self, query: str) -> Dict[str, Any]:
+        """Query plan for a query, listing tables read without an index"""
+        result = self.execute_query(f"EXPLAIN QUERY PLAN {query.strip().rstrip(';')}")
+        plan = [dict(zip(result["columns"], row)) for row in result["results"]]
+        scans = []
+        for step in plan:
+            detail = str(step.get("detail", ""))
+            # e.g. "SCAN orders" vs "SEARCH orders USING INDEX ..." / "SCAN orders USING COVERING INDEX"
+            if detail.startswith("SCAN ") and "INDEX" not in detail:
+                table = detail.split()[1]
+                if table == "TABLE":
+                    table = detail.split()[2]
+                scans.append({"table": table, "rows_examined": None, "rows_returned": None})
+        return {"full_scans": scans, "cost": None, "plan": plan}
+
+    def watch_table(self, table_name: str, stop: threading.Event,
+                    poll_interval: float = 5.0) -> Iterator[Optional[Dict[str, Any]]]:
+        """SQLite Cloud has no change feed over REST; re-read the preview every poll_interval"""
+        yield {"op": "snapshot", "data": self.get_table_data(table_name)}
+        while not stop.wait(poll_interval):
+            yield {"op": "changed", "data": self.get_table_data(table_name)}
+
+    def estimate_rows(self, table_name: str) -> Optional[float]:
+        """SQLite keeps no cheap row statistics over REST"""
+        return None
+
+    def cancel_query(self, query_id: str) -> bool:
+        """Requests to the SQLite Cloud REST API cannot be cancelled"""
+        return False